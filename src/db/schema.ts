@@ -103,18 +103,25 @@ export const rawArtifacts = pgTable("raw_artifacts", {
 // ============================================
 
 // Feature sets table - defines versioned feature configurations
-export const featureSets = pgTable("feature_sets", {
-  id: uuid("id").defaultRandom().primaryKey(),
-  orgId: uuid("org_id")
-    .notNull()
-    .references(() => orgs.id, { onDelete: "cascade" }),
-  name: text("name").notNull(), // e.g., "core_v1"
-  version: text("version").notNull(), // e.g., "1.0.0"
-  featureList: jsonb("feature_list").notNull(), // array of feature names
-  createdAt: timestamp("created_at", { withTimezone: true })
-    .defaultNow()
-    .notNull(),
-});
+export const featureSets = pgTable(
+  "feature_sets",
+  {
+    id: uuid("id").defaultRandom().primaryKey(),
+    orgId: uuid("org_id")
+      .notNull()
+      .references(() => orgs.id, { onDelete: "cascade" }),
+    name: text("name").notNull(), // e.g., "core_v1"
+    version: text("version").notNull(), // e.g., "1.0.0"
+    featureList: jsonb("feature_list").notNull(), // array of feature names
+    createdAt: timestamp("created_at", { withTimezone: true })
+      .defaultNow()
+      .notNull(),
+  },
+  (table) => ({
+    // Unique constraint for get-or-create upsert by name
+    uniqueOrgName: unique().on(table.orgId, table.name),
+  })
+);
 
 // Sample features table - stores computed features for samples
 export const sampleFeatures = pgTable(
@@ -212,6 +219,7 @@ export const predictions = pgTable(
     yHat: doublePrecision("y_hat").notNull(), // predicted probability
     threshold: doublePrecision("threshold").notNull(), // decision threshold used
     predictedClass: integer("predicted_class").notNull(), // 0 or 1
+    modelEtag: text("model_etag"), // S3 ETag of the bundle that made the prediction
     createdAt: timestamp("created_at", { withTimezone: true })
       .defaultNow()
       .notNull(),
@@ -237,6 +245,8 @@ export const leafEmbeddings = pgTable(
       .notNull()
       .references(() => modelRegistry.id, { onDelete: "cascade" }),
     leafIndices: jsonb("leaf_indices").notNull(), // array of leaf indices per tree
+    // Numbering of leafIndices: 1 = XGBoost node ids, 2 = leaves 0..L-1 per tree
+    leafEncoding: integer("leaf_encoding").default(1).notNull(),
     createdAt: timestamp("created_at", { withTimezone: true })
       .defaultNow()
       .notNull(),
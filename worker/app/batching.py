@@ -0,0 +1,186 @@
+"""Micro-batching of concurrent single-sample predictions."""
+
+import asyncio
+import logging
+import math
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from .config import get_settings
+from .inference import InferenceError, PredictionResult, run_batch_inference
+from .models import LoadedModel
+
+logger = logging.getLogger(__name__)
+
+# Queued request: (loaded_model, sample_id, features, caller's future)
+_Pending = Tuple[LoadedModel, str, Dict[str, Any], asyncio.Future]
+
+
+class BatchScheduler:
+    """
+    Coalesce concurrent single-sample predictions into batch calls.
+    
+    Each model gets a queue and a drain task. The task takes the first
+    waiting request, collects more for up to `max_latency_ms` (or until
+    `max_batch` are waiting), then runs one `run_batch_inference` call
+    and hands each caller its own result. The fixed per-call XGBoost
+    overhead is paid once per batch instead of once per request. A
+    model's queue and task are dropped after `idle_seconds` without
+    requests and recreated on its next one.
+    
+    A scheduler belongs to the event loop it is first used on.
+    """
+    
+    def __init__(
+        self,
+        max_batch: int = 32,
+        max_latency_ms: float = 5.0,
+        idle_seconds: float = 60.0,
+    ):
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self.idle_seconds = idle_seconds
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    async def submit(
+        self,
+        loaded_model: LoadedModel,
+        model_id: str,
+        sample_id: str,
+        features: Dict[str, Any],
+    ) -> PredictionResult:
+        """
+        Queue one sample for prediction and wait for its result.
+        
+        Raises:
+            InferenceError: If inference fails for this sample's batch
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # No await between finding the queue and queueing on it, so an
+        # idle drain task can't retire the queue in between
+        self._queue_for(model_id).put_nowait(
+            (loaded_model, sample_id, features, future)
+        )
+        return await future
+    
+    def _queue_for(self, model_id: str) -> asyncio.Queue:
+        """Get the model's queue, starting its drain task on first use."""
+        queue = self._queues.get(model_id)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[model_id] = queue
+            self._tasks[model_id] = asyncio.create_task(
+                self._drain(model_id, queue)
+            )
+        return queue
+    
+    async def _drain(self, model_id: str, queue: asyncio.Queue) -> None:
+        """Run batches for one model until it has been idle for a while."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), self.idle_seconds)
+            except asyncio.TimeoutError:
+                if not queue.empty():
+                    continue
+                # Idle: retire the queue; the next request starts a new one
+                del self._queues[model_id]
+                del self._tasks[model_id]
+                return
+            batch: List[_Pending] = [first]
+            
+            # Collect whatever else arrives within the latency window
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._run_batch(model_id, batch)
+            except Exception as e:
+                # Should not happen (_run_batch resolves every future), but
+                # a stuck caller is worse than a lost exception
+                logger.exception(f"Batch for model {model_id} failed")
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def _run_batch(self, model_id: str, batch: List[_Pending]) -> None:
+        """Run inference for a batch and resolve each caller's future."""
+        # Requests for one model_id share a bundle; use the newest load
+        loaded_model = batch[-1][0]
+        samples = [(sample_id, features) for _, sample_id, features, _ in batch]
+        
+        try:
+            # Inference is CPU-bound; keep the loop free to queue the next batch
+            results = await asyncio.get_running_loop().run_in_executor(
+                get_predict_executor(),
+                run_batch_inference,
+                loaded_model,
+                model_id,
+                samples,
+            )
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, _, _, future), result in zip(batch, results):
+            if future.done():
+                # Caller went away (e.g. client disconnected)
+                continue
+            if math.isnan(result.y_hat) or math.isinf(result.y_hat):
+                future.set_exception(
+                    InferenceError(f"Invalid prediction value: {result.y_hat}")
+                )
+            else:
+                future.set_result(result)
+
+
+@lru_cache(maxsize=None)
+def get_predict_executor() -> ThreadPoolExecutor:
+    """
+    Get the thread pool that runs model inference.
+    
+    Inference is CPU-bound, so it gets its own pool (sized by
+    `worker_predict_threads`, default the CPU count) rather than sharing
+    the default executor with blocking DB and S3 calls.
+    """
+    settings = get_settings()
+    return ThreadPoolExecutor(
+        max_workers=settings.worker_predict_threads or os.cpu_count(),
+        thread_name_prefix="predict",
+    )
+
+
+# Key: event loop, Value: its BatchScheduler. One per loop, since a
+# scheduler's queues and tasks are bound to the loop it runs on
+_batch_schedulers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_batch_scheduler() -> BatchScheduler:
+    """Get the prediction batch scheduler for the running event loop."""
+    loop = asyncio.get_running_loop()
+    scheduler = _batch_schedulers.get(loop)
+    if scheduler is None:
+        settings = get_settings()
+        scheduler = _batch_schedulers[loop] = BatchScheduler(
+            max_batch=settings.predict_max_batch,
+            max_latency_ms=settings.predict_max_latency_ms,
+            idle_seconds=settings.predict_batch_idle_seconds,
+        )
+    return scheduler
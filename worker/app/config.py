@@ -2,6 +2,7 @@
 
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -9,6 +10,10 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800
+    db_fetch_size: int = 1000
     
     # Redis (Upstash)
     upstash_redis_rest_url: str
@@ -22,14 +27,38 @@ class Settings(BaseSettings):
     
     # Worker settings
     poll_interval_seconds: float = 1.0
+    queue_block_timeout_seconds: int = 5
+    consumer_concurrency: int = 4
+    batch_size: int = 16
     max_retries: int = 3
     
+    # Prediction micro-batching
+    predict_max_batch: int = 32
+    predict_max_latency_ms: float = 5.0
+    # A model's batch queue is dropped after this long without requests
+    predict_batch_idle_seconds: float = 60.0
+    # Report y_hat at full float32 precision instead of rounding it to
+    # float16 (e.g. for debugging)
+    predict_full_precision: bool = False
+    # Inference pool size (defaults to the CPU count); boosters run
+    # single-threaded so concurrency comes from this pool
+    worker_predict_threads: Optional[int] = None
+    
+    # Loaded model bundle cache
+    bundle_cache_size: int = 8
+    bundle_cache_revalidate_seconds: float = 30.0
+    
+    # How long a model registry row is cached; 0 disables the cache
+    model_registry_cache_seconds: float = 30.0
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
+        # Allow setting names that start with "model_"
+        protected_namespaces = ()
 
 
-@lru_cache()
+@lru_cache(maxsize=None)
 def get_settings() -> Settings:
     """Get cached settings instance."""
     return Settings()
@@ -1,24 +1,26 @@
 """Redis queue consumer for processing jobs."""
 
 import asyncio
-import json
 import logging
-import traceback
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from datetime import datetime
 
-from upstash_redis import Redis
+import orjson
+from upstash_redis.asyncio import Redis as AsyncRedis
 
 from .config import get_settings
 from .db import (
+    db_session,
     get_artifact,
     get_or_create_feature_set,
     upsert_sample_features,
     update_job_status,
     get_job,
 )
+from .redis_clients import get_queue_redis
 from .s3 import download_file_as_string
-from .extractors import TimeseriesCSVExtractor, EndpointJSONExtractor
+from .extractors import get_extractor
 
 # Configure logging
 logging.basicConfig(
@@ -30,21 +32,6 @@ logger = logging.getLogger(__name__)
 # Queue name
 JOBS_QUEUE = "jobs:default"
 
-# Schema version to extractor mapping
-EXTRACTORS = {
-    "v1_timeseries_csv": TimeseriesCSVExtractor(),
-    "v1_endpoint_json": EndpointJSONExtractor(),
-}
-
-
-def get_redis_client() -> Redis:
-    """Create Upstash Redis client."""
-    settings = get_settings()
-    return Redis(
-        url=settings.upstash_redis_rest_url,
-        token=settings.upstash_redis_rest_token,
-    )
-
 
 def process_extract_features_job(job_data: dict) -> None:
     """
@@ -61,37 +48,35 @@ def process_extract_features_job(job_data: dict) -> None:
     logger.info(f"Processing job {job_id} for artifact {artifact_id}")
     
     try:
-        # Set job status to running
-        update_job_status(job_id, "running")
-        
-        # Fetch artifact and verify org_id
-        artifact = get_artifact(artifact_id, org_id)
-        if not artifact:
-            raise ValueError(f"Artifact {artifact_id} not found or org mismatch")
-        
-        sample_id = artifact.get("sample_id")
-        if not sample_id:
-            raise ValueError("Artifact is not attached to a sample")
+        # Mark the job running and resolve its inputs in one transaction
+        with db_session() as session:
+            update_job_status(job_id, "running", session=session)
+            
+            # Fetch artifact and verify org_id
+            artifact = get_artifact(artifact_id, org_id, session=session)
+            if not artifact:
+                raise ValueError(f"Artifact {artifact_id} not found or org mismatch")
+            
+            sample_id = artifact.get("sample_id")
+            if not sample_id:
+                raise ValueError("Artifact is not attached to a sample")
+            
+            # Get or create feature set
+            feature_set_id = get_or_create_feature_set(
+                org_id, feature_set_name, session=session
+            )
         
         storage_key = artifact["storage_key"]
         schema_version = artifact["schema_version"]
         
         logger.info(f"Artifact schema version: {schema_version}")
         
-        # Get or create feature set
-        feature_set_id = get_or_create_feature_set(org_id, feature_set_name)
-        
         # Download file from S3
         logger.info(f"Downloading file from S3: {storage_key}")
         content = download_file_as_string(storage_key)
         
         # Select extractor based on schema version
-        extractor = EXTRACTORS.get(schema_version)
-        if not extractor:
-            raise ValueError(
-                f"Unsupported schema version: {schema_version}. "
-                f"Supported versions: {', '.join(EXTRACTORS.keys())}"
-            )
+        extractor = get_extractor(schema_version)
         
         # Extract features
         logger.info(f"Extracting features using {extractor.schema_version} extractor")
@@ -100,34 +85,37 @@ def process_extract_features_job(job_data: dict) -> None:
         if not result.success:
             raise ValueError(f"Feature extraction failed: {result.error}")
         
-        # Upsert features to database
+        # Store features and mark the job succeeded in one transaction
         logger.info(f"Storing {result.num_features} features for sample {sample_id}")
-        feature_record_id = upsert_sample_features(
-            org_id=org_id,
-            sample_id=sample_id,
-            feature_set_id=feature_set_id,
-            artifact_id=artifact_id,
-            features=result.features,
-        )
-        
-        # Update job status to succeeded
-        output = {
-            "sample_id": sample_id,
-            "feature_set": feature_set_name,
-            "num_features": result.num_features,
-            "feature_record_id": feature_record_id,
-        }
-        update_job_status(job_id, "succeeded", output=output)
+        with db_session() as session:
+            feature_record_id = upsert_sample_features(
+                org_id=org_id,
+                sample_id=sample_id,
+                feature_set_id=feature_set_id,
+                artifact_id=artifact_id,
+                features=result.features,
+                session=session,
+            )
+            
+            output = {
+                "sample_id": sample_id,
+                "feature_set": feature_set_name,
+                "num_features": result.num_features,
+                "feature_record_id": feature_record_id,
+            }
+            update_job_status(job_id, "succeeded", output=output, session=session)
         
         logger.info(f"Job {job_id} completed successfully")
         
     except Exception as e:
         error_msg = str(e)
-        tb = traceback.format_exc()
-        logger.error(f"Job {job_id} failed: {error_msg}\n{tb}")
+        # Full traceback goes to the logs; the job row gets a short summary
+        logger.exception(f"Job {job_id} failed: {error_msg}")
         
         # Update job status to failed
-        update_job_status(job_id, "failed", error=f"{error_msg}\n\n{tb[:500]}")
+        update_job_status(
+            job_id, "failed", error=f"{type(e).__name__}: {error_msg[:200]}"
+        )
 
 
 def process_job(job_data: dict) -> None:
@@ -145,47 +133,112 @@ def process_job(job_data: dict) -> None:
         logger.warning(f"Unknown job type: {job_type}")
 
 
+async def pop_jobs(redis: AsyncRedis, timeout: int, count: int) -> List[str]:
+    """
+    Block until jobs are available or the timeout elapses.
+    
+    Uses BLMPOP so an idle consumer waits on the server instead of
+    re-polling, and a backlog is drained up to `count` jobs per
+    round trip.
+    
+    Args:
+        redis: Redis client
+        timeout: Seconds to block before returning an empty list
+        count: Maximum number of jobs to pop
+        
+    Returns:
+        Raw job messages in queue order (empty if the queue stayed empty)
+    """
+    # BLMPOP replies with [queue, [messages...]] or nil on timeout
+    reply = await redis.execute(
+        ["BLMPOP", timeout, 1, JOBS_QUEUE, "RIGHT", "COUNT", count]
+    )
+    if not reply:
+        return []
+    return reply[1]
+
+
 async def run_consumer() -> None:
     """
     Run the Redis queue consumer.
     
-    Polls the queue continuously and processes jobs.
+    Blocks on the queue continuously and hands each job to a thread
+    pool, so the next pop overlaps with jobs already in flight.
     """
     settings = get_settings()
-    redis = get_redis_client()
+    loop = asyncio.get_running_loop()
     
-    logger.info(f"Starting consumer, polling queue: {JOBS_QUEUE}")
-    logger.info(f"Poll interval: {settings.poll_interval_seconds}s")
+    # Jobs are blocking (S3, DB, CPU), so they run on worker threads;
+    # the semaphore stops us popping more jobs than we can run
+    executor = ThreadPoolExecutor(
+        max_workers=settings.consumer_concurrency,
+        thread_name_prefix="job-worker",
+    )
+    slots = asyncio.Semaphore(settings.consumer_concurrency)
+    in_flight = 0
+    
+    def on_job_done(future: asyncio.Future) -> None:
+        nonlocal in_flight
+        in_flight -= 1
+        slots.release()
+        if not future.cancelled() and future.exception():
+            logger.error("Job crashed", exc_info=future.exception())
+    
+    logger.info(f"Starting consumer, listening on queue: {JOBS_QUEUE}")
+    logger.info(f"Block timeout: {settings.queue_block_timeout_seconds}s")
+    logger.info(
+        f"Concurrency: {settings.consumer_concurrency}, "
+        f"batch size: {settings.batch_size}"
+    )
     
-    while True:
-        try:
-            # Pop from the right side of the queue (FIFO)
-            message = redis.rpop(JOBS_QUEUE)
+    async with get_queue_redis() as redis:
+        while True:
+            # Wait for a free worker, then pop at most as many jobs as
+            # there are free workers so nothing sits popped but unstarted
+            async with slots:
+                count = min(
+                    settings.batch_size,
+                    settings.consumer_concurrency - in_flight,
+                )
             
-            if message:
-                # Parse the job data
-                if isinstance(message, bytes):
-                    message = message.decode("utf-8")
-                if isinstance(message, str):
-                    job_data = json.loads(message)
-                else:
-                    job_data = message
+            try:
+                # Pop from the right side of the queue (FIFO)
+                messages = await pop_jobs(
+                    redis, settings.queue_block_timeout_seconds, count
+                )
+            except Exception:
+                logger.exception("Consumer error")
+                # Wait before retrying
+                await asyncio.sleep(settings.poll_interval_seconds * 2)
+                continue
+            
+            for message in messages:
+                try:
+                    # Parse the job data
+                    if isinstance(message, (bytes, str)):
+                        job_data = orjson.loads(message)
+                    else:
+                        job_data = message
+                except Exception as e:
+                    logger.error(f"Discarding malformed job message: {str(e)}")
+                    continue
                 
                 logger.info(f"Received job: {job_data.get('job_id')}")
                 
-                # Process the job (in a sync context for now)
-                process_job(job_data)
-            else:
-                # No message, wait before polling again
-                await asyncio.sleep(settings.poll_interval_seconds)
-                
-        except Exception as e:
-            logger.error(f"Consumer error: {str(e)}")
-            logger.error(traceback.format_exc())
-            # Wait before retrying
-            await asyncio.sleep(settings.poll_interval_seconds * 2)
+                # Process the job on the pool; the slot is freed when it finishes
+                await slots.acquire()
+                in_flight += 1
+                future = loop.run_in_executor(executor, process_job, job_data)
+                future.add_done_callback(on_job_done)
 
 
 def start_consumer() -> None:
-    """Start the consumer in the event loop."""
-    asyncio.run(run_consumer())
+    """Start the consumer in its own event loop (uvloop when available)."""
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(run_consumer())
@@ -1,31 +1,83 @@
 """Database connection and queries for the worker."""
 
-from datetime import datetime, timezone
-from typing import Any, Optional
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Union
+from sqlalchemy import Engine, bindparam, create_engine, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, sessionmaker
 from contextlib import contextmanager
-import json
+from functools import lru_cache
+import logging
+import threading
+import time
+import numpy as np
+import orjson
 
 from .config import get_settings
 
+logger = logging.getLogger(__name__)
 
-def get_engine():
+
+# Numbering of stored leaf_indices (leaf_embeddings.leaf_encoding):
+# XGBoost node ids, or leaves numbered 0..L-1 per tree. LEAF_ENCODING is
+# the current one; node ids are stored when a model's leaves can't be
+# renumbered, and by rows written before leaves were renumbered.
+LEAF_ENCODING_NODE_IDS = 1
+LEAF_ENCODING = 2
+
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Get the shared SQLAlchemy engine (one connection pool per process)."""
+    global _engine
+    if _engine is None:
+        # Job threads can race here on startup; only one may build the pool
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+    return _engine
+
+
+def _create_engine() -> Engine:
     """Create SQLAlchemy engine with connection pooling."""
     settings = get_settings()
+    # Logged once per process; a second line means a second pool
+    logger.info(
+        f"Creating database engine (pool_size={settings.db_pool_size}, "
+        f"max_overflow={settings.db_max_overflow})"
+    )
     return create_engine(
         settings.database_url,
-        pool_size=5,
-        max_overflow=10,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        # Recycle before the server drops idle connections, and reuse the
+        # most recently returned connection so idle extras can time out
+        pool_recycle=settings.db_pool_recycle,
+        pool_use_lifo=True,
         pool_pre_ping=True,
+        # Serializer for JSONB-typed bind parameters
+        json_serializer=_json_serializer,
     )
 
 
+def _json_serializer(value: Any) -> str:
+    """Serialize a JSON bind parameter with orjson (numpy arrays included)."""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+@lru_cache(maxsize=None)
+def get_session_factory() -> sessionmaker:
+    """Get the shared session factory bound to the engine."""
+    return sessionmaker(bind=get_engine(), expire_on_commit=False)
+
+
 def get_session():
     """Create a new database session."""
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    return Session()
+    return get_session_factory()()
 
 
 @contextmanager
@@ -42,188 +94,178 @@ def db_session():
         session.close()
 
 
-def get_artifact(artifact_id: str, org_id: str) -> Optional[dict]:
+@contextmanager
+def session_scope(session: Optional[Session] = None):
+    """
+    Use the caller's session if given, otherwise open a new one.
+    
+    Lets several queries share one connection and commit together.
+    """
+    if session is not None:
+        yield session
+    else:
+        with db_session() as new_session:
+            yield new_session
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    """Format a nullable timestamp column for JSON output."""
+    return value.isoformat() if value else None
+
+
+_GET_ARTIFACT_SQL = text("""
+    SELECT id::text, org_id::text, experiment_id::text, sample_id::text,
+           storage_key, file_name, file_type, sha256, schema_version, created_at
+    FROM raw_artifacts
+    WHERE id = :artifact_id AND org_id = :org_id
+""")
+
+
+def get_artifact(
+    artifact_id: str,
+    org_id: str,
+    session: Optional[Session] = None,
+) -> Optional[dict]:
     """Fetch artifact by ID, verifying org_id."""
-    with db_session() as session:
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id, org_id, experiment_id, sample_id, storage_key, 
-                       file_name, file_type, sha256, schema_version, created_at
-                FROM raw_artifacts
-                WHERE id = :artifact_id AND org_id = :org_id
-            """),
+            _GET_ARTIFACT_SQL,
             {"artifact_id": artifact_id, "org_id": org_id}
         )
-        row = result.fetchone()
+        row = result.mappings().first()
         if row:
-            return {
-                "id": str(row.id),
-                "org_id": str(row.org_id),
-                "experiment_id": str(row.experiment_id),
-                "sample_id": str(row.sample_id) if row.sample_id else None,
-                "storage_key": row.storage_key,
-                "file_name": row.file_name,
-                "file_type": row.file_type,
-                "sha256": row.sha256,
-                "schema_version": row.schema_version,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-            }
+            artifact = dict(row)
+            artifact["created_at"] = _isoformat(row["created_at"])
+            return artifact
         return None
 
 
-def get_or_create_feature_set(org_id: str, name: str = "core_v1", version: str = "1.0.0") -> str:
+_CORE_V1_FEATURE_LIST_JSON = orjson.dumps({
+    "timeseries": [
+        "baseline_mean", "baseline_std", "y_max", "y_min", 
+        "t_at_max", "auc", "slope_early", "t_halfmax", "snr"
+    ],
+    "endpoint": ["endpoint_value"],
+    "global": ["num_channels", "signal_quality_flag"]
+}).decode()
+
+# No-op update on conflict so RETURNING yields the existing row
+_UPSERT_FEATURE_SET_SQL = text("""
+    INSERT INTO feature_sets (org_id, name, version, feature_list)
+    VALUES (:org_id, :name, :version, :feature_list)
+    ON CONFLICT (org_id, name) DO UPDATE SET name = EXCLUDED.name
+    RETURNING id
+""")
+
+
+def get_or_create_feature_set(
+    org_id: str,
+    name: str = "core_v1",
+    version: str = "1.0.0",
+    session: Optional[Session] = None,
+) -> str:
     """Get or create a feature set, returning its ID."""
-    feature_list = {
-        "timeseries": [
-            "baseline_mean", "baseline_std", "y_max", "y_min", 
-            "t_at_max", "auc", "slope_early", "t_halfmax", "snr"
-        ],
-        "endpoint": ["endpoint_value"],
-        "global": ["num_channels", "signal_quality_flag"]
-    }
-    
-    with db_session() as session:
-        # Try to get existing
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id FROM feature_sets
-                WHERE org_id = :org_id AND name = :name
-            """),
-            {"org_id": org_id, "name": name}
-        )
-        row = result.fetchone()
-        if row:
-            return str(row.id)
-        
-        # Create new
-        result = session.execute(
-            text("""
-                INSERT INTO feature_sets (org_id, name, version, feature_list)
-                VALUES (:org_id, :name, :version, :feature_list)
-                RETURNING id
-            """),
+            _UPSERT_FEATURE_SET_SQL,
             {
                 "org_id": org_id,
                 "name": name,
                 "version": version,
-                "feature_list": json.dumps(feature_list)
+                "feature_list": _CORE_V1_FEATURE_LIST_JSON
             }
         )
         row = result.fetchone()
         return str(row.id)
 
 
+_UPSERT_SAMPLE_FEATURES_SQL = text("""
+    INSERT INTO sample_features 
+    (org_id, sample_id, feature_set_id, artifact_id, features, computed_at)
+    VALUES (:org_id, :sample_id, :feature_set_id, :artifact_id, :features, NOW())
+    ON CONFLICT (sample_id, feature_set_id) DO UPDATE
+    SET features = EXCLUDED.features,
+        artifact_id = EXCLUDED.artifact_id,
+        computed_at = EXCLUDED.computed_at
+    RETURNING id
+""")
+
+
 def upsert_sample_features(
     org_id: str,
     sample_id: str,
     feature_set_id: str,
     artifact_id: str,
-    features: dict
+    features: dict,
+    session: Optional[Session] = None,
 ) -> str:
     """Upsert sample features, returning the record ID."""
-    with db_session() as session:
-        # Check if exists
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id FROM sample_features
-                WHERE sample_id = :sample_id AND feature_set_id = :feature_set_id
-            """),
-            {"sample_id": sample_id, "feature_set_id": feature_set_id}
+            _UPSERT_SAMPLE_FEATURES_SQL,
+            {
+                "org_id": org_id,
+                "sample_id": sample_id,
+                "feature_set_id": feature_set_id,
+                "artifact_id": artifact_id,
+                "features": orjson.dumps(features).decode()
+            }
         )
-        existing = result.fetchone()
-        
-        if existing:
-            # Update
-            session.execute(
-                text("""
-                    UPDATE sample_features
-                    SET features = :features,
-                        artifact_id = :artifact_id,
-                        computed_at = :computed_at
-                    WHERE id = :id
-                """),
-                {
-                    "id": str(existing.id),
-                    "features": json.dumps(features),
-                    "artifact_id": artifact_id,
-                    "computed_at": datetime.now(timezone.utc)
-                }
-            )
-            return str(existing.id)
-        else:
-            # Insert
-            result = session.execute(
-                text("""
-                    INSERT INTO sample_features 
-                    (org_id, sample_id, feature_set_id, artifact_id, features, computed_at)
-                    VALUES (:org_id, :sample_id, :feature_set_id, :artifact_id, :features, :computed_at)
-                    RETURNING id
-                """),
-                {
-                    "org_id": org_id,
-                    "sample_id": sample_id,
-                    "feature_set_id": feature_set_id,
-                    "artifact_id": artifact_id,
-                    "features": json.dumps(features),
-                    "computed_at": datetime.now(timezone.utc)
-                }
-            )
-            row = result.fetchone()
-            return str(row.id)
+        row = result.fetchone()
+        return str(row.id)
+
+
+_UPDATE_JOB_STATUS_SQL = text("""
+    UPDATE jobs
+    SET status = :status,
+        output = :output,
+        error = :error,
+        updated_at = NOW()
+    WHERE id = :job_id
+""")
 
 
 def update_job_status(
     job_id: str,
     status: str,
     output: Optional[dict] = None,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    session: Optional[Session] = None,
 ) -> None:
     """Update job status."""
-    with db_session() as session:
+    with session_scope(session) as session:
         session.execute(
-            text("""
-                UPDATE jobs
-                SET status = :status,
-                    output = :output,
-                    error = :error,
-                    updated_at = :updated_at
-                WHERE id = :job_id
-            """),
+            _UPDATE_JOB_STATUS_SQL,
             {
                 "job_id": job_id,
                 "status": status,
-                "output": json.dumps(output) if output else None,
-                "error": error,
-                "updated_at": datetime.now(timezone.utc)
+                "output": orjson.dumps(output).decode() if output else None,
+                "error": error
             }
         )
 
 
-def get_job(job_id: str) -> Optional[dict]:
+_GET_JOB_SQL = text("""
+    SELECT id::text, org_id::text, type, status, input, output, error,
+           created_at, updated_at
+    FROM jobs
+    WHERE id = :job_id
+""")
+
+
+def get_job(job_id: str, session: Optional[Session] = None) -> Optional[dict]:
     """Get a job by ID."""
-    with db_session() as session:
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id, org_id, type, status, input, output, error, 
-                       created_at, updated_at
-                FROM jobs
-                WHERE id = :job_id
-            """),
+            _GET_JOB_SQL,
             {"job_id": job_id}
         )
-        row = result.fetchone()
+        row = result.mappings().first()
         if row:
-            return {
-                "id": str(row.id),
-                "org_id": str(row.org_id),
-                "type": row.type,
-                "status": row.status,
-                "input": row.input,
-                "output": row.output,
-                "error": row.error,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
-            }
+            job = dict(row)
+            job["created_at"] = _isoformat(row["created_at"])
+            job["updated_at"] = _isoformat(row["updated_at"])
+            return job
         return None
 
 
@@ -231,10 +273,36 @@ def get_job(job_id: str) -> Optional[dict]:
 # Phase 3: Model Registry & Predictions
 # ============================================
 
+# UUIDs are cast to text in SQL so rows arrive ready to return
+_MODEL_COLUMNS = """
+    id::text, org_id::text, name, version, task, feature_set_id::text,
+    storage_key, model_format, metrics, is_active, created_at
+"""
+
+
+def _model_to_dict(row: Mapping[str, Any]) -> dict:
+    """Convert a model_registry row mapping to a dict."""
+    model = dict(row)
+    model["created_at"] = _isoformat(row["created_at"])
+    return model
+
+
+_GET_MODEL_SQL = text(f"""
+    SELECT {_MODEL_COLUMNS}
+    FROM model_registry
+    WHERE id = :model_id AND org_id = :org_id
+""")
+
+
 def get_model(model_id: str, org_id: str) -> Optional[dict]:
     """
     Get a model from the registry by ID, verifying org ownership.
     
+    Registry rows are cached per (model_id, org_id) for up to
+    MODEL_REGISTRY_CACHE_SECONDS, so a model the app deletes or
+    deactivates stops resolving within that window; call
+    clear_model_cache() to drop them at once.
+    
     Args:
         model_id: UUID of the model
         org_id: UUID of the organization (for security)
@@ -242,74 +310,183 @@ def get_model(model_id: str, org_id: str) -> Optional[dict]:
     Returns:
         Model dict or None if not found
     """
+    ttl = get_settings().model_registry_cache_seconds
+    try:
+        if ttl > 0:
+            model = _get_model_row(model_id, org_id, int(time.monotonic() // ttl))
+        else:
+            model = _get_model_row.__wrapped__(model_id, org_id, 0)
+    except LookupError:
+        return None
+    return dict(model)
+
+
+@lru_cache(maxsize=256)
+def _get_model_row(model_id: str, org_id: str, window: int) -> Mapping[str, Any]:
+    """
+    Fetch a model as a read-only mapping, raising LookupError if missing.
+    
+    `window` is the TTL period the lookup falls in. It only keys the
+    cache: once the period rolls over the row is fetched again, and
+    entries from past periods age out of the LRU.
+    """
     with db_session() as session:
         result = session.execute(
-            text("""
-                SELECT id, org_id, name, version, task, feature_set_id,
-                       storage_key, model_format, metrics, is_active, created_at
-                FROM model_registry
-                WHERE id = :model_id AND org_id = :org_id
-            """),
+            _GET_MODEL_SQL,
             {"model_id": model_id, "org_id": org_id}
         )
-        row = result.fetchone()
-        if row:
-            return {
-                "id": str(row.id),
-                "org_id": str(row.org_id),
-                "name": row.name,
-                "version": row.version,
-                "task": row.task,
-                "feature_set_id": str(row.feature_set_id),
-                "storage_key": row.storage_key,
-                "model_format": row.model_format,
-                "metrics": row.metrics,
-                "is_active": row.is_active,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-            }
-        return None
+        row = result.mappings().first()
+    if row is None:
+        # Raised rather than returned so misses aren't cached: the
+        # model may be registered after the first lookup
+        raise LookupError(model_id)
+    return MappingProxyType(_model_to_dict(row))
+
+
+def clear_model_cache() -> None:
+    """Drop all cached model registry rows."""
+    _get_model_row.cache_clear()
+
 
+_GET_MODELS_BY_IDS_SQL = text(f"""
+    SELECT {_MODEL_COLUMNS}
+    FROM model_registry
+    WHERE id = ANY(CAST(:model_ids AS uuid[])) AND org_id = :org_id
+""")
 
-def get_sample(sample_id: str, org_id: str) -> Optional[dict]:
+
+def get_models_by_ids(
+    model_ids: List[str],
+    org_id: str,
+    session: Optional[Session] = None,
+) -> Dict[str, dict]:
+    """
+    Get several models in one query, verifying org ownership.
+    
+    Args:
+        model_ids: UUIDs of the models
+        org_id: UUID of the organization (for security)
+        
+    Returns:
+        Model dicts keyed by model ID; missing or foreign IDs are absent
+    """
+    if not model_ids:
+        return {}
+    with session_scope(session) as session:
+        result = session.execute(
+            _GET_MODELS_BY_IDS_SQL,
+            {"model_ids": list(model_ids), "org_id": org_id}
+        )
+        return {row["id"]: _model_to_dict(row) for row in result.mappings()}
+
+
+_SAMPLE_COLUMNS = """
+    id::text, org_id::text, experiment_id::text, sample_label,
+    patient_pseudonym, matrix_type, collected_at, created_at
+"""
+
+
+def _sample_to_dict(row: Mapping[str, Any]) -> dict:
+    """Convert a samples row mapping to a dict."""
+    sample = dict(row)
+    sample["collected_at"] = _isoformat(row["collected_at"])
+    sample["created_at"] = _isoformat(row["created_at"])
+    return sample
+
+
+_GET_SAMPLE_SQL = text(f"""
+    SELECT {_SAMPLE_COLUMNS}
+    FROM samples
+    WHERE id = :sample_id AND org_id = :org_id
+""")
+
+
+def get_sample(
+    sample_id: str,
+    org_id: str,
+    session: Optional[Session] = None,
+) -> Optional[dict]:
     """
     Get a sample by ID, verifying org ownership.
     
     Args:
         sample_id: UUID of the sample
         org_id: UUID of the organization (for security)
+        session: Optional session to run in
         
     Returns:
         Sample dict or None if not found
     """
-    with db_session() as session:
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id, org_id, experiment_id, sample_label, 
-                       patient_pseudonym, matrix_type, collected_at, created_at
-                FROM samples
-                WHERE id = :sample_id AND org_id = :org_id
-            """),
+            _GET_SAMPLE_SQL,
             {"sample_id": sample_id, "org_id": org_id}
         )
-        row = result.fetchone()
+        row = result.mappings().first()
         if row:
-            return {
-                "id": str(row.id),
-                "org_id": str(row.org_id),
-                "experiment_id": str(row.experiment_id),
-                "sample_label": row.sample_label,
-                "patient_pseudonym": row.patient_pseudonym,
-                "matrix_type": row.matrix_type,
-                "collected_at": row.collected_at.isoformat() if row.collected_at else None,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-            }
+            return _sample_to_dict(row)
         return None
 
 
+_GET_SAMPLES_BY_IDS_SQL = text(f"""
+    SELECT {_SAMPLE_COLUMNS}
+    FROM samples
+    WHERE id = ANY(CAST(:sample_ids AS uuid[])) AND org_id = :org_id
+""")
+
+
+def get_samples_by_ids(
+    sample_ids: List[str],
+    org_id: str,
+    session: Optional[Session] = None,
+) -> Dict[str, dict]:
+    """
+    Get several samples in one query, verifying org ownership.
+    
+    Args:
+        sample_ids: UUIDs of the samples
+        org_id: UUID of the organization (for security)
+        
+    Returns:
+        Sample dicts keyed by sample ID; missing or foreign IDs are absent
+    """
+    if not sample_ids:
+        return {}
+    with session_scope(session) as session:
+        result = session.execute(
+            _GET_SAMPLES_BY_IDS_SQL,
+            {"sample_ids": list(sample_ids), "org_id": org_id}
+        )
+        return {row["id"]: _sample_to_dict(row) for row in result.mappings()}
+
+
+_SAMPLE_FEATURES_COLUMNS = """
+    id::text, org_id::text, sample_id::text, feature_set_id::text,
+    artifact_id::text, features, computed_at
+"""
+
+_GET_SAMPLE_FEATURES_SQL = text(f"""
+    SELECT {_SAMPLE_FEATURES_COLUMNS}
+    FROM sample_features
+    WHERE sample_id = :sample_id 
+      AND feature_set_id = :feature_set_id
+      AND org_id = :org_id
+""")
+
+
+def _sample_features_to_dict(row: Mapping[str, Any]) -> dict:
+    """Convert a sample_features row to a JSON-friendly dict."""
+    # features is JSONB, already decoded to a dict
+    sample_features = dict(row)
+    sample_features["computed_at"] = _isoformat(row["computed_at"])
+    return sample_features
+
+
 def get_sample_features_by_feature_set(
     sample_id: str, 
     feature_set_id: str,
-    org_id: str
+    org_id: str,
+    session: Optional[Session] = None,
 ) -> Optional[dict]:
     """
     Get sample features for a specific feature set.
@@ -318,40 +495,149 @@ def get_sample_features_by_feature_set(
         sample_id: UUID of the sample
         feature_set_id: UUID of the feature set
         org_id: UUID of the organization (for security)
+        session: Optional session to run in
         
     Returns:
         Sample features dict or None if not found
     """
-    with db_session() as session:
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id, org_id, sample_id, feature_set_id, artifact_id,
-                       features, computed_at
-                FROM sample_features
-                WHERE sample_id = :sample_id 
-                  AND feature_set_id = :feature_set_id
-                  AND org_id = :org_id
-            """),
+            _GET_SAMPLE_FEATURES_SQL,
             {
                 "sample_id": sample_id, 
                 "feature_set_id": feature_set_id,
                 "org_id": org_id
             }
         )
-        row = result.fetchone()
+        row = result.mappings().first()
         if row:
-            return {
-                "id": str(row.id),
-                "org_id": str(row.org_id),
-                "sample_id": str(row.sample_id),
-                "feature_set_id": str(row.feature_set_id),
-                "artifact_id": str(row.artifact_id) if row.artifact_id else None,
-                "features": row.features,  # Already JSONB, returned as dict
-                "computed_at": row.computed_at.isoformat() if row.computed_at else None,
-            }
+            return _sample_features_to_dict(row)
         return None
 
 
+_GET_SAMPLE_FEATURES_BY_SAMPLE_IDS_SQL = text(f"""
+    SELECT {_SAMPLE_FEATURES_COLUMNS}
+    FROM sample_features
+    WHERE sample_id = ANY(CAST(:sample_ids AS uuid[]))
+      AND feature_set_id = :feature_set_id
+      AND org_id = :org_id
+""")
+
+
+def get_sample_features_by_sample_ids(
+    sample_ids: List[str],
+    feature_set_id: str,
+    org_id: str,
+    session: Optional[Session] = None,
+) -> Dict[str, dict]:
+    """
+    Get several samples' features for a feature set in one query.
+    
+    Args:
+        sample_ids: UUIDs of the samples
+        feature_set_id: UUID of the feature set
+        org_id: UUID of the organization (for security)
+        session: Optional session to run in
+        
+    Returns:
+        Sample features dicts keyed by sample ID; samples without
+        features for the set are absent
+    """
+    if not sample_ids:
+        return {}
+    with session_scope(session) as session:
+        result = session.execute(
+            _GET_SAMPLE_FEATURES_BY_SAMPLE_IDS_SQL,
+            {
+                "sample_ids": list(sample_ids),
+                "feature_set_id": feature_set_id,
+                "org_id": org_id,
+            }
+        )
+        return {
+            row["sample_id"]: _sample_features_to_dict(row)
+            for row in result.mappings()
+        }
+
+
+# A prediction is current when it was made after the sample's features
+# were last computed, by the model bundle now in S3 (a bundle can be
+# re-uploaded under the same model_id, so its ETag is compared), and its
+# leaf embedding was saved too, in the current leaf encoding. Rows
+# written before ETags were recorded have none and are never current.
+_GET_CURRENT_PREDICTIONS_SQL = text("""
+    SELECT p.sample_id::text, p.y_hat, p.threshold, p.predicted_class
+    FROM predictions p
+    JOIN sample_features sf
+      ON sf.sample_id = p.sample_id
+     AND sf.feature_set_id = :feature_set_id
+     AND sf.org_id = p.org_id
+    JOIN leaf_embeddings le
+      ON le.sample_id = p.sample_id
+     AND le.model_id = p.model_id
+    WHERE p.sample_id = ANY(CAST(:sample_ids AS uuid[]))
+      AND p.model_id = :model_id
+      AND p.org_id = :org_id
+      AND p.model_etag = :model_etag
+      AND le.leaf_encoding = :leaf_encoding
+      AND p.created_at >= sf.computed_at
+""")
+
+
+def get_current_predictions(
+    sample_ids: List[str],
+    model_id: str,
+    model_etag: str,
+    feature_set_id: str,
+    org_id: str,
+    session: Optional[Session] = None,
+) -> Dict[str, dict]:
+    """
+    Get the predictions that are still current for the samples' features.
+    
+    Args:
+        sample_ids: UUIDs of the samples
+        model_id: UUID of the model
+        model_etag: S3 ETag of the model's current bundle
+        feature_set_id: UUID of the model's feature set
+        org_id: UUID of the organization (for security)
+        session: Optional session to run in
+        
+    Returns:
+        Prediction dicts (y_hat, threshold, predicted_class) keyed by
+        sample ID; samples needing a (re)prediction are absent
+    """
+    if not sample_ids:
+        return {}
+    with session_scope(session) as session:
+        result = session.execute(
+            _GET_CURRENT_PREDICTIONS_SQL,
+            {
+                "sample_ids": list(sample_ids),
+                "model_id": model_id,
+                "model_etag": model_etag,
+                "feature_set_id": feature_set_id,
+                "org_id": org_id,
+                "leaf_encoding": LEAF_ENCODING,
+            }
+        )
+        return {row["sample_id"]: dict(row) for row in result.mappings()}
+
+
+_UPSERT_PREDICTION_SQL = text("""
+    INSERT INTO predictions
+    (org_id, sample_id, model_id, y_hat, threshold, predicted_class, model_etag, created_at)
+    VALUES (:org_id, :sample_id, :model_id, :y_hat, :threshold, :predicted_class, :model_etag, NOW())
+    ON CONFLICT (sample_id, model_id) DO UPDATE
+    SET y_hat = EXCLUDED.y_hat,
+        threshold = EXCLUDED.threshold,
+        predicted_class = EXCLUDED.predicted_class,
+        model_etag = EXCLUDED.model_etag,
+        created_at = EXCLUDED.created_at
+    RETURNING id
+""")
+
+
 def upsert_prediction(
     org_id: str,
     sample_id: str,
@@ -359,6 +645,8 @@ def upsert_prediction(
     y_hat: float,
     threshold: float,
     predicted_class: int,
+    model_etag: Optional[str] = None,
+    session: Optional[Session] = None,
 ) -> str:
     """
     Upsert a prediction record.
@@ -370,69 +658,111 @@ def upsert_prediction(
         y_hat: Predicted probability
         threshold: Decision threshold used
         predicted_class: Predicted class (0 or 1)
+        model_etag: S3 ETag of the model bundle that made the prediction
+        session: Optional session to run in
         
     Returns:
         UUID of the prediction record
     """
-    with db_session() as session:
-        # Check if exists
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id FROM predictions
-                WHERE sample_id = :sample_id AND model_id = :model_id
-            """),
-            {"sample_id": sample_id, "model_id": model_id}
+            _UPSERT_PREDICTION_SQL,
+            {
+                "org_id": org_id,
+                "sample_id": sample_id,
+                "model_id": model_id,
+                "y_hat": y_hat,
+                "threshold": threshold,
+                "predicted_class": predicted_class,
+                "model_etag": model_etag,
+            }
         )
-        existing = result.fetchone()
+        row = result.fetchone()
+        return str(row.id)
+
+
+# One statement for the whole batch: each column arrives as an array
+# and unnest() zips them back into rows
+_UPSERT_PREDICTIONS_BATCH_SQL = text("""
+    INSERT INTO predictions
+    (org_id, sample_id, model_id, y_hat, threshold, predicted_class, model_etag, created_at)
+    SELECT org_id, sample_id, model_id, y_hat, threshold, predicted_class, model_etag, NOW()
+    FROM unnest(
+        CAST(:org_ids AS uuid[]),
+        CAST(:sample_ids AS uuid[]),
+        CAST(:model_ids AS uuid[]),
+        CAST(:y_hats AS double precision[]),
+        CAST(:thresholds AS double precision[]),
+        CAST(:predicted_classes AS integer[]),
+        CAST(:model_etags AS text[])
+    ) AS batch(org_id, sample_id, model_id, y_hat, threshold, predicted_class, model_etag)
+    ON CONFLICT (sample_id, model_id) DO UPDATE
+    SET y_hat = EXCLUDED.y_hat,
+        threshold = EXCLUDED.threshold,
+        predicted_class = EXCLUDED.predicted_class,
+        model_etag = EXCLUDED.model_etag,
+        created_at = EXCLUDED.created_at
+    RETURNING id
+""")
+
+
+def upsert_predictions_batch(
+    rows: List[dict],
+    session: Optional[Session] = None,
+) -> List[str]:
+    """
+    Upsert many prediction records in a single round trip.
+    
+    Args:
+        rows: Dicts with the same keys as upsert_prediction's arguments
+        session: Optional session to run in
         
-        if existing:
-            # Update
-            session.execute(
-                text("""
-                    UPDATE predictions
-                    SET y_hat = :y_hat,
-                        threshold = :threshold,
-                        predicted_class = :predicted_class,
-                        created_at = :created_at
-                    WHERE id = :id
-                """),
-                {
-                    "id": str(existing.id),
-                    "y_hat": y_hat,
-                    "threshold": threshold,
-                    "predicted_class": predicted_class,
-                    "created_at": datetime.now(timezone.utc)
-                }
-            )
-            return str(existing.id)
-        else:
-            # Insert
-            result = session.execute(
-                text("""
-                    INSERT INTO predictions 
-                    (org_id, sample_id, model_id, y_hat, threshold, predicted_class, created_at)
-                    VALUES (:org_id, :sample_id, :model_id, :y_hat, :threshold, :predicted_class, :created_at)
-                    RETURNING id
-                """),
-                {
-                    "org_id": org_id,
-                    "sample_id": sample_id,
-                    "model_id": model_id,
-                    "y_hat": y_hat,
-                    "threshold": threshold,
-                    "predicted_class": predicted_class,
-                    "created_at": datetime.now(timezone.utc)
-                }
-            )
-            row = result.fetchone()
-            return str(row.id)
+    Returns:
+        UUIDs of the upserted prediction records
+    """
+    if not rows:
+        return []
+    
+    # ON CONFLICT cannot touch the same row twice in one statement,
+    # so keep only the last prediction per (sample_id, model_id)
+    deduped = {(row["sample_id"], row["model_id"]): row for row in rows}
+    rows = list(deduped.values())
+    
+    with session_scope(session) as session:
+        result = session.execute(
+            _UPSERT_PREDICTIONS_BATCH_SQL,
+            {
+                "org_ids": [row["org_id"] for row in rows],
+                "sample_ids": [row["sample_id"] for row in rows],
+                "model_ids": [row["model_id"] for row in rows],
+                "y_hats": [row["y_hat"] for row in rows],
+                "thresholds": [row["threshold"] for row in rows],
+                "predicted_classes": [row["predicted_class"] for row in rows],
+                "model_etags": [row.get("model_etag") for row in rows],
+            }
+        )
+        return [str(row.id) for row in result]
+
+
+_UPSERT_LEAF_EMBEDDING_SQL = text("""
+    INSERT INTO leaf_embeddings
+    (org_id, sample_id, model_id, leaf_indices, leaf_encoding, created_at)
+    VALUES (:org_id, :sample_id, :model_id, :leaf_indices, :leaf_encoding, NOW())
+    ON CONFLICT (sample_id, model_id) DO UPDATE
+    SET leaf_indices = EXCLUDED.leaf_indices,
+        leaf_encoding = EXCLUDED.leaf_encoding,
+        created_at = EXCLUDED.created_at
+    RETURNING id
+""").bindparams(bindparam("leaf_indices", type_=JSONB))
 
 
 def upsert_leaf_embedding(
     org_id: str,
     sample_id: str,
     model_id: str,
-    leaf_indices: list,
+    leaf_indices: Union[list, np.ndarray],
+    leaf_encoding: int = LEAF_ENCODING,
+    session: Optional[Session] = None,
 ) -> str:
     """
     Upsert a leaf embedding record.
@@ -441,63 +771,104 @@ def upsert_leaf_embedding(
         org_id: Organization UUID
         sample_id: Sample UUID
         model_id: Model UUID
-        leaf_indices: List of leaf indices (one per tree)
+        leaf_indices: Leaf ids (one per tree), as a list or 1-D array
+        leaf_encoding: Numbering of leaf_indices (LEAF_ENCODING or
+            LEAF_ENCODING_NODE_IDS)
+        session: Optional session to run in
         
     Returns:
         UUID of the leaf embedding record
     """
-    with db_session() as session:
-        # Check if exists
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                SELECT id FROM leaf_embeddings
-                WHERE sample_id = :sample_id AND model_id = :model_id
-            """),
-            {"sample_id": sample_id, "model_id": model_id}
+            _UPSERT_LEAF_EMBEDDING_SQL,
+            {
+                "org_id": org_id,
+                "sample_id": sample_id,
+                "model_id": model_id,
+                "leaf_indices": leaf_indices,
+                "leaf_encoding": leaf_encoding,
+            }
         )
-        existing = result.fetchone()
+        row = result.fetchone()
+        return str(row.id)
+
+
+# Same unnest() approach as the predictions batch; leaf_indices arrive
+# as serialized JSON text and are cast to jsonb[] so each row keeps its
+# own list
+_UPSERT_LEAF_EMBEDDINGS_BATCH_SQL = text("""
+    INSERT INTO leaf_embeddings
+    (org_id, sample_id, model_id, leaf_indices, leaf_encoding, created_at)
+    SELECT org_id, sample_id, model_id, leaf_indices, leaf_encoding, NOW()
+    FROM unnest(
+        CAST(:org_ids AS uuid[]),
+        CAST(:sample_ids AS uuid[]),
+        CAST(:model_ids AS uuid[]),
+        CAST(:leaf_indices AS jsonb[]),
+        CAST(:leaf_encodings AS integer[])
+    ) AS batch(org_id, sample_id, model_id, leaf_indices, leaf_encoding)
+    ON CONFLICT (sample_id, model_id) DO UPDATE
+    SET leaf_indices = EXCLUDED.leaf_indices,
+        leaf_encoding = EXCLUDED.leaf_encoding,
+        created_at = EXCLUDED.created_at
+    RETURNING id
+""")
+
+
+def upsert_leaf_embeddings_batch(
+    rows: List[dict],
+    session: Optional[Session] = None,
+) -> List[str]:
+    """
+    Upsert many leaf embedding records in a single round trip.
+    
+    Args:
+        rows: Dicts with the same keys as upsert_leaf_embedding's arguments
+        session: Optional session to run in
         
-        if existing:
-            # Update
-            session.execute(
-                text("""
-                    UPDATE leaf_embeddings
-                    SET leaf_indices = :leaf_indices,
-                        created_at = :created_at
-                    WHERE id = :id
-                """),
-                {
-                    "id": str(existing.id),
-                    "leaf_indices": json.dumps(leaf_indices),
-                    "created_at": datetime.now(timezone.utc)
-                }
-            )
-            return str(existing.id)
-        else:
-            # Insert
-            result = session.execute(
-                text("""
-                    INSERT INTO leaf_embeddings 
-                    (org_id, sample_id, model_id, leaf_indices, created_at)
-                    VALUES (:org_id, :sample_id, :model_id, :leaf_indices, :created_at)
-                    RETURNING id
-                """),
-                {
-                    "org_id": org_id,
-                    "sample_id": sample_id,
-                    "model_id": model_id,
-                    "leaf_indices": json.dumps(leaf_indices),
-                    "created_at": datetime.now(timezone.utc)
-                }
-            )
-            row = result.fetchone()
-            return str(row.id)
+    Returns:
+        UUIDs of the upserted leaf embedding records
+    """
+    if not rows:
+        return []
+    
+    # ON CONFLICT cannot touch the same row twice in one statement,
+    # so keep only the last embedding per (sample_id, model_id)
+    deduped = {(row["sample_id"], row["model_id"]): row for row in rows}
+    rows = list(deduped.values())
+    
+    with session_scope(session) as session:
+        result = session.execute(
+            _UPSERT_LEAF_EMBEDDINGS_BATCH_SQL,
+            {
+                "org_ids": [row["org_id"] for row in rows],
+                "sample_ids": [row["sample_id"] for row in rows],
+                "model_ids": [row["model_id"] for row in rows],
+                "leaf_indices": [
+                    _json_serializer(row["leaf_indices"]) for row in rows
+                ],
+                "leaf_encodings": [
+                    row.get("leaf_encoding", LEAF_ENCODING) for row in rows
+                ],
+            }
+        )
+        return [str(row.id) for row in result]
+
+
+_CREATE_PREDICT_JOB_SQL = text("""
+    INSERT INTO jobs 
+    (org_id, type, status, input, created_at, updated_at)
+    VALUES (:org_id, :type, :status, :input, NOW(), NOW())
+    RETURNING id
+""")
 
 
 def create_predict_job(
     org_id: str,
     sample_id: str,
     model_id: str,
+    session: Optional[Session] = None,
 ) -> str:
     """
     Create a job record for a prediction.
@@ -506,67 +877,88 @@ def create_predict_job(
         org_id: Organization UUID
         sample_id: Sample UUID
         model_id: Model UUID
+        session: Optional session to run in
         
     Returns:
         UUID of the job record
     """
-    with db_session() as session:
+    with session_scope(session) as session:
         result = session.execute(
-            text("""
-                INSERT INTO jobs 
-                (org_id, type, status, input, created_at, updated_at)
-                VALUES (:org_id, :type, :status, :input, :created_at, :updated_at)
-                RETURNING id
-            """),
+            _CREATE_PREDICT_JOB_SQL,
             {
                 "org_id": org_id,
                 "type": "predict_xgboost",
                 "status": "running",
-                "input": json.dumps({
+                "input": orjson.dumps({
                     "sample_id": sample_id,
                     "model_id": model_id,
-                }),
-                "created_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc)
+                }).decode()
             }
         )
         row = result.fetchone()
         return str(row.id)
 
 
-def get_samples_for_experiment(experiment_id: str, org_id: str) -> list:
+_GET_SAMPLES_FOR_EXPERIMENT_SQL = text(f"""
+    SELECT {_SAMPLE_COLUMNS}
+    FROM samples
+    WHERE experiment_id = :experiment_id AND org_id = :org_id
+    ORDER BY created_at ASC
+""")
+
+
+def get_samples_for_experiment(
+    experiment_id: str,
+    org_id: str,
+    session: Optional[Session] = None,
+) -> list:
     """
     Get all samples for an experiment.
     
     Args:
         experiment_id: UUID of the experiment
         org_id: UUID of the organization (for security)
+        session: Optional session to run in
         
     Returns:
         List of sample dicts
     """
-    with db_session() as session:
+    return list(iter_samples_for_experiment(experiment_id, org_id, session=session))
+
+
+def iter_samples_for_experiment(
+    experiment_id: str,
+    org_id: str,
+    session: Optional[Session] = None,
+    fetch_size: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Stream the samples of an experiment.
+    
+    Rows come from a server-side cursor `fetch_size` at a time, so a
+    large experiment is never buffered in full as raw rows. The
+    session stays open until the iterator is exhausted or closed.
+    
+    Args:
+        experiment_id: UUID of the experiment
+        org_id: UUID of the organization (for security)
+        session: Optional session to run in
+        fetch_size: Rows fetched per cursor round trip
+            (defaults to the db_fetch_size setting)
+        
+    Yields:
+        Sample dicts in creation order
+    """
+    if fetch_size is None:
+        fetch_size = get_settings().db_fetch_size
+    
+    with session_scope(session) as session:
+        # yield_per sets both the server-side cursor and the fetchmany()
+        # size, i.e. how many rows each round trip prefetches
         result = session.execute(
-            text("""
-                SELECT id, org_id, experiment_id, sample_label, 
-                       patient_pseudonym, matrix_type, collected_at, created_at
-                FROM samples
-                WHERE experiment_id = :experiment_id AND org_id = :org_id
-                ORDER BY created_at ASC
-            """),
-            {"experiment_id": experiment_id, "org_id": org_id}
+            _GET_SAMPLES_FOR_EXPERIMENT_SQL,
+            {"experiment_id": experiment_id, "org_id": org_id},
+            execution_options={"yield_per": fetch_size},
         )
-        rows = result.fetchall()
-        return [
-            {
-                "id": str(row.id),
-                "org_id": str(row.org_id),
-                "experiment_id": str(row.experiment_id),
-                "sample_label": row.sample_label,
-                "patient_pseudonym": row.patient_pseudonym,
-                "matrix_type": row.matrix_type,
-                "collected_at": row.collected_at.isoformat() if row.collected_at else None,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-            }
-            for row in rows
-        ]
+        for row in result.mappings():
+            yield _sample_to_dict(row)
@@ -1,15 +1,46 @@
 """Feature extractors package."""
 
+from types import MappingProxyType
+from typing import Mapping
+
 from .base import BaseExtractor, ExtractionResult
 from .timeseries_csv import TimeseriesCSVExtractor
 from .endpoint_json import EndpointJSONExtractor
 from .core_v1 import compute_timeseries_features, compute_endpoint_features
 
+# Schema version to extractor mapping; extractors are stateless, so one
+# instance of each is shared
+EXTRACTORS: Mapping[str, BaseExtractor] = MappingProxyType({
+    extractor.schema_version: extractor
+    for extractor in (TimeseriesCSVExtractor(), EndpointJSONExtractor())
+})
+SUPPORTED_SCHEMA_VERSIONS = ", ".join(EXTRACTORS)
+
+
+def get_extractor(schema_version: str) -> BaseExtractor:
+    """
+    Get the extractor for a schema version.
+    
+    Raises:
+        ValueError: If no extractor handles the schema version
+    """
+    extractor = EXTRACTORS.get(schema_version)
+    if extractor is None:
+        raise ValueError(
+            f"Unsupported schema version: {schema_version}. "
+            f"Supported versions: {SUPPORTED_SCHEMA_VERSIONS}"
+        )
+    return extractor
+
+
 __all__ = [
     "BaseExtractor",
     "ExtractionResult",
     "TimeseriesCSVExtractor",
     "EndpointJSONExtractor",
+    "EXTRACTORS",
+    "SUPPORTED_SCHEMA_VERSIONS",
+    "get_extractor",
     "compute_timeseries_features",
     "compute_endpoint_features",
 ]
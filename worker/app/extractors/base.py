@@ -21,13 +21,12 @@ class ExtractionResult:
     @classmethod
     def from_features(cls, features: Dict[str, Any]) -> "ExtractionResult":
         """Create a success result from features."""
-        # Count total features (including nested channel features)
-        count = 0
-        for key, value in features.items():
-            if isinstance(value, dict):
-                count += len(value)
-            else:
-                count += 1
+        # Count total features; computed features are flat, but
+        # passed-through metadata values may be nested dicts
+        count = sum(
+            len(value) if isinstance(value, dict) else 1
+            for value in features.values()
+        )
         return cls(success=True, features=features, num_features=count)
 
 
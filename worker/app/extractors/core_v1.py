@@ -7,15 +7,43 @@ All computations are deterministic:
 - Ordering does not affect computation
 """
 
-from typing import Dict, List, Any, Optional
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+import math
 import numpy as np
-from scipy import integrate
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the numpy path is used instead
+    njit = None
+
+
+# Per-channel timeseries feature names, in output order
+TIMESERIES_FEATURE_NAMES = (
+    "baseline_mean",
+    "baseline_std",
+    "y_max",
+    "y_min",
+    "t_at_max",
+    "auc",
+    "slope_early",
+    "t_halfmax",
+    "snr",
+)
+
+
+@lru_cache(maxsize=1024)
+def _timeseries_feature_keys(channel: str) -> Tuple[str, ...]:
+    """Feature keys for a channel; channel names repeat across samples."""
+    prefix = f"channel.{channel}."
+    return tuple(prefix + name for name in TIMESERIES_FEATURE_NAMES)
 
 
 def compute_timeseries_features(
     t: np.ndarray, 
     y: np.ndarray,
-    channel: str
+    channel: str,
+    assume_sorted: bool = False,
 ) -> Dict[str, Any]:
     """
     Compute features for a single channel's time-series data.
@@ -24,6 +52,8 @@ def compute_timeseries_features(
         t: Time values (seconds)
         y: Signal values
         channel: Channel name for feature key prefixing
+        assume_sorted: Skip the sort when the caller has already
+            ordered the samples by t
         
     Returns:
         Dictionary of features with keys like "channel.<CHANNEL>.baseline_mean"
@@ -32,14 +62,67 @@ def compute_timeseries_features(
         return _empty_channel_features(channel)
     
     # Sort by time to ensure deterministic ordering
-    sorted_indices = np.argsort(t)
-    t = t[sorted_indices]
-    y = y[sorted_indices]
+    if not assume_sorted:
+        sorted_indices = np.argsort(t)
+        t = t[sorted_indices]
+        y = y[sorted_indices]
+    t = np.ascontiguousarray(t, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
     
     n = len(y)
     
-    # Baseline calculations (first 10% of samples)
+    # Baseline is the first 10% of samples, early slope the first 20%
     baseline_n = max(1, int(n * 0.1))
+    early_n = max(2, int(n * 0.2))
+    
+    (
+        baseline_mean,
+        baseline_std,
+        y_max,
+        y_min,
+        t_at_max,
+        auc,
+        slope_early,
+        halfmax_idx,
+    ) = _timeseries_stats(t, y, baseline_n, early_n)
+    
+    # t_halfmax - first t where y >= baseline_mean + 0.5*(y_max - baseline_mean)
+    t_halfmax: Optional[float] = (
+        float(t[halfmax_idx]) if halfmax_idx >= 0 else None
+    )
+    
+    # SNR - signal to noise ratio
+    snr = (y_max - baseline_mean) / max(baseline_std, 1e-9)
+    
+    # Build feature dictionary with stable keys
+    values = (
+        float(baseline_mean),
+        float(baseline_std),
+        float(y_max),
+        float(y_min),
+        float(t_at_max),
+        float(auc),
+        float(slope_early),
+        t_halfmax,
+        float(snr),
+    )
+    return dict(zip(_timeseries_feature_keys(channel), values))
+
+
+def _timeseries_stats_numpy(
+    t: np.ndarray,
+    y: np.ndarray,
+    baseline_n: int,
+    early_n: int,
+) -> Tuple[float, float, float, float, float, float, float, int]:
+    """
+    Compute raw timeseries statistics with numpy (time-sorted input).
+    
+    Returns:
+        Tuple of (baseline_mean, baseline_std, y_max, y_min, t_at_max,
+        auc, slope_early, halfmax_idx); halfmax_idx is -1 if y never
+        reaches the half-max threshold
+    """
     baseline_y = y[:baseline_n]
     baseline_mean = float(np.mean(baseline_y))
     baseline_std = float(np.std(baseline_y, ddof=0))  # Population std for determinism
@@ -53,60 +136,114 @@ def compute_timeseries_features(
     t_at_max = float(t[max_idx])
     
     # AUC - trapezoidal integral
-    auc = float(integrate.trapezoid(y, t))
+    auc = float(np.dot(y[1:] + y[:-1], np.diff(t)) * 0.5)
     
     # Slope early - linear regression over first 20% of points
-    early_n = max(2, int(n * 0.2))
     early_t = t[:early_n]
     early_y = y[:early_n]
     
+    slope_early = 0.0
     if len(early_t) >= 2:
-        # Deterministic linear regression using numpy
-        coeffs = np.polyfit(early_t, early_y, 1)
-        slope_early = float(coeffs[0])
-    else:
-        slope_early = 0.0
+        # Closed-form least-squares slope on centered values
+        dt = early_t - early_t.mean()
+        sxx = float(np.dot(dt, dt))
+        if sxx > 0.0:
+            slope_early = float(np.dot(dt, early_y - early_y.mean()) / sxx)
     
-    # t_halfmax - first t where y >= baseline_mean + 0.5*(y_max - baseline_mean)
+    # First index at or above half max (argmax finds the first True)
     halfmax_threshold = baseline_mean + 0.5 * (y_max - baseline_mean)
-    t_halfmax: Optional[float] = None
-    for i, yi in enumerate(y):
-        if yi >= halfmax_threshold:
-            t_halfmax = float(t[i])
-            break
+    above = y >= halfmax_threshold
+    halfmax_idx = int(above.argmax()) if above.any() else -1
     
-    # SNR - signal to noise ratio
-    snr = (y_max - baseline_mean) / max(baseline_std, 1e-9)
+    return (
+        baseline_mean, baseline_std, y_max, y_min, t_at_max,
+        auc, slope_early, halfmax_idx,
+    )
+
+
+def _timeseries_stats_kernel(
+    t: np.ndarray,
+    y: np.ndarray,
+    baseline_n: int,
+    early_n: int,
+) -> Tuple[float, float, float, float, float, float, float, int]:
+    """
+    Same statistics as _timeseries_stats_numpy, as loops for numba.
     
-    # Build feature dictionary with stable keys
-    prefix = f"channel.{channel}"
-    return {
-        f"{prefix}.baseline_mean": baseline_mean,
-        f"{prefix}.baseline_std": baseline_std,
-        f"{prefix}.y_max": y_max,
-        f"{prefix}.y_min": y_min,
-        f"{prefix}.t_at_max": t_at_max,
-        f"{prefix}.auc": auc,
-        f"{prefix}.slope_early": slope_early,
-        f"{prefix}.t_halfmax": t_halfmax,
-        f"{prefix}.snr": float(snr),
-    }
+    Compiled with numba.njit when available: min/max/argmax and the
+    trapezoid AUC share one pass over the data, and the baseline and
+    early-slope moments only touch their leading slices.
+    """
+    n = y.shape[0]
+    
+    # Baseline mean and population std (two-pass for accuracy)
+    total = 0.0
+    for i in range(baseline_n):
+        total += y[i]
+    baseline_mean = total / baseline_n
+    sq = 0.0
+    for i in range(baseline_n):
+        d = y[i] - baseline_mean
+        sq += d * d
+    baseline_std = math.sqrt(sq / baseline_n)
+    
+    # Extremes (first occurrence of max) and trapezoidal AUC
+    y_max = y[0]
+    y_min = y[0]
+    max_idx = 0
+    auc = 0.0
+    for i in range(1, n):
+        yi = y[i]
+        if yi > y_max:
+            y_max = yi
+            max_idx = i
+        if yi < y_min:
+            y_min = yi
+        auc += 0.5 * (yi + y[i - 1]) * (t[i] - t[i - 1])
+    
+    # Least-squares slope over the early window, on centered values
+    m = min(early_n, n)
+    slope_early = 0.0
+    if m >= 2:
+        t_sum = 0.0
+        y_sum = 0.0
+        for i in range(m):
+            t_sum += t[i]
+            y_sum += y[i]
+        t_mean = t_sum / m
+        y_mean = y_sum / m
+        sxx = 0.0
+        sxy = 0.0
+        for i in range(m):
+            dt = t[i] - t_mean
+            sxx += dt * dt
+            sxy += dt * (y[i] - y_mean)
+        if sxx > 0.0:
+            slope_early = sxy / sxx
+    
+    # First index at or above half max
+    halfmax_threshold = baseline_mean + 0.5 * (y_max - baseline_mean)
+    halfmax_idx = -1
+    for i in range(n):
+        if y[i] >= halfmax_threshold:
+            halfmax_idx = i
+            break
+    
+    return (
+        baseline_mean, baseline_std, y_max, y_min, t[max_idx],
+        auc, slope_early, halfmax_idx,
+    )
+
+
+if njit is not None:
+    _timeseries_stats = njit(cache=True)(_timeseries_stats_kernel)
+else:
+    _timeseries_stats = _timeseries_stats_numpy
 
 
 def _empty_channel_features(channel: str) -> Dict[str, Any]:
     """Return empty features for a channel with no data."""
-    prefix = f"channel.{channel}"
-    return {
-        f"{prefix}.baseline_mean": None,
-        f"{prefix}.baseline_std": None,
-        f"{prefix}.y_max": None,
-        f"{prefix}.y_min": None,
-        f"{prefix}.t_at_max": None,
-        f"{prefix}.auc": None,
-        f"{prefix}.slope_early": None,
-        f"{prefix}.t_halfmax": None,
-        f"{prefix}.snr": None,
-    }
+    return dict.fromkeys(_timeseries_feature_keys(channel))
 
 
 def compute_endpoint_features(
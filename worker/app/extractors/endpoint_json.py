@@ -1,7 +1,7 @@
 """Endpoint JSON extractor for v1_endpoint_json schema."""
 
 from typing import Optional, Dict, Any, List
-import json
+import orjson
 
 from .base import BaseExtractor, ExtractionResult
 from .core_v1 import compute_endpoint_features, compute_global_features
@@ -36,57 +36,69 @@ class EndpointJSONExtractor(BaseExtractor):
     
     def validate(self, content: str) -> tuple[bool, Optional[str]]:
         """Validate the JSON content matches expected schema."""
+        data, error = self._parse_and_validate(content)
+        return data is not None, error
+    
+    def _parse_and_validate(
+        self, content: str
+    ) -> tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Parse and validate the JSON content in one go.
+        
+        Returns:
+            Tuple of (parsed_data, error_message); parsed_data is None
+            when the content is invalid
+        """
         try:
-            data = json.loads(content)
+            data = orjson.loads(content)
             
             # Must be an object
             if not isinstance(data, dict):
-                return False, "JSON root must be an object"
+                return None, "JSON root must be an object"
             
             # Must have channels array
             if "channels" not in data:
-                return False, "Missing required field 'channels'"
+                return None, "Missing required field 'channels'"
             
             channels = data["channels"]
             if not isinstance(channels, list):
-                return False, "Field 'channels' must be an array"
+                return None, "Field 'channels' must be an array"
             
             if len(channels) == 0:
-                return False, "Field 'channels' must have at least one entry"
+                return None, "Field 'channels' must have at least one entry"
             
             # Validate each channel entry
             for i, ch in enumerate(channels):
                 if not isinstance(ch, dict):
-                    return False, f"Channel entry {i} must be an object"
+                    return None, f"Channel entry {i} must be an object"
                 
                 if "channel" not in ch:
-                    return False, f"Channel entry {i} missing 'channel' field"
+                    return None, f"Channel entry {i} missing 'channel' field"
                 
                 if "value" not in ch:
-                    return False, f"Channel entry {i} missing 'value' field"
+                    return None, f"Channel entry {i} missing 'value' field"
                 
                 if not isinstance(ch["channel"], str):
-                    return False, f"Channel entry {i} 'channel' must be a string"
+                    return None, f"Channel entry {i} 'channel' must be a string"
                 
                 if not isinstance(ch["value"], (int, float)):
-                    return False, f"Channel entry {i} 'value' must be a number"
+                    return None, f"Channel entry {i} 'value' must be a number"
             
-            return True, None
+            return data, None
             
-        except json.JSONDecodeError as e:
-            return False, f"JSON parsing error: {str(e)}"
+        except orjson.JSONDecodeError as e:
+            return None, f"JSON parsing error: {str(e)}"
         except Exception as e:
-            return False, f"Validation error: {str(e)}"
+            return None, f"Validation error: {str(e)}"
     
     def extract(self, content: str) -> ExtractionResult:
         """Extract features from the endpoint JSON."""
-        # First validate
-        is_valid, error = self.validate(content)
-        if not is_valid:
+        # Validate, keeping the parsed document for extraction
+        data, error = self._parse_and_validate(content)
+        if data is None:
             return ExtractionResult.failure(error or "Validation failed")
         
         try:
-            data = json.loads(content)
             channels_data = data["channels"]
             
             # Sort channels by name for determinism
@@ -8,6 +8,13 @@ import numpy as np
 from .base import BaseExtractor, ExtractionResult
 from .core_v1 import compute_timeseries_features, compute_global_features
 
+try:
+    import pyarrow
+    # Multithreaded C++ CSV reader; same dtype inference as pandas' own
+    _CSV_ENGINE = "pyarrow"
+except ImportError:  # pyarrow is optional; use pandas' C parser instead
+    _CSV_ENGINE = "c"
+
 
 class TimeseriesCSVExtractor(BaseExtractor):
     """
@@ -35,54 +42,65 @@ class TimeseriesCSVExtractor(BaseExtractor):
     
     def validate(self, content: str) -> tuple[bool, Optional[str]]:
         """Validate the CSV content matches expected schema."""
+        df, error = self._parse_and_validate(content)
+        return df is not None, error
+    
+    def _parse_and_validate(
+        self, content: str
+    ) -> tuple[Optional[pd.DataFrame], Optional[str]]:
+        """
+        Parse and validate the CSV content in one go.
+        
+        Returns:
+            Tuple of (dataframe, error_message); dataframe is None when
+            the content is invalid
+        """
         try:
-            df = pd.read_csv(StringIO(content))
+            df = pd.read_csv(StringIO(content), engine=_CSV_ENGINE)
             
             # Check required columns exist
             missing = self.REQUIRED_COLUMNS - set(df.columns)
             if missing:
-                return False, f"Missing required columns: {', '.join(missing)}"
+                return None, f"Missing required columns: {', '.join(missing)}"
             
             # Check for non-empty data
             if len(df) == 0:
-                return False, "CSV file is empty (no data rows)"
+                return None, "CSV file is empty (no data rows)"
             
             # Check column types
             # channel should be string-like
             if not pd.api.types.is_object_dtype(df["channel"]) and not pd.api.types.is_string_dtype(df["channel"]):
-                return False, "Column 'channel' must be string type"
+                return None, "Column 'channel' must be string type"
             
             # t and y should be numeric
             if not pd.api.types.is_numeric_dtype(df["t"]):
-                # Try to convert
+                # Try to convert (kept so extract doesn't convert again)
                 try:
-                    pd.to_numeric(df["t"])
+                    df["t"] = pd.to_numeric(df["t"])
                 except (ValueError, TypeError):
-                    return False, "Column 't' must be numeric (float)"
+                    return None, "Column 't' must be numeric (float)"
             
             if not pd.api.types.is_numeric_dtype(df["y"]):
                 try:
-                    pd.to_numeric(df["y"])
+                    df["y"] = pd.to_numeric(df["y"])
                 except (ValueError, TypeError):
-                    return False, "Column 'y' must be numeric (float)"
+                    return None, "Column 'y' must be numeric (float)"
             
-            return True, None
+            return df, None
             
         except pd.errors.ParserError as e:
-            return False, f"CSV parsing error: {str(e)}"
+            return None, f"CSV parsing error: {str(e)}"
         except Exception as e:
-            return False, f"Validation error: {str(e)}"
+            return None, f"Validation error: {str(e)}"
     
     def extract(self, content: str) -> ExtractionResult:
         """Extract features from the timeseries CSV."""
-        # First validate
-        is_valid, error = self.validate(content)
-        if not is_valid:
+        # Validate, keeping the parsed frame for extraction
+        df, error = self._parse_and_validate(content)
+        if df is None:
             return ExtractionResult.failure(error or "Validation failed")
         
         try:
-            df = pd.read_csv(StringIO(content))
-            
             # Convert columns to proper types
             df["channel"] = df["channel"].astype(str)
             df["t"] = pd.to_numeric(df["t"], errors="coerce")
@@ -94,18 +112,29 @@ class TimeseriesCSVExtractor(BaseExtractor):
             if len(df) == 0:
                 return ExtractionResult.failure("No valid data after parsing")
             
-            # Get unique channels (sorted for determinism)
-            channels: List[str] = sorted(df["channel"].unique().tolist())
+            # Sort once by (channel, t) so each channel is a contiguous,
+            # time-ordered slice (channels sorted for determinism)
+            ch = df["channel"].to_numpy()
+            t = df["t"].to_numpy(dtype=np.float64)
+            y = df["y"].to_numpy(dtype=np.float64)
+            order = np.lexsort((t, ch))
+            ch, t, y = ch[order], t[order], y[order]
+            
+            # Slice boundaries where the channel label changes
+            starts = np.flatnonzero(ch[1:] != ch[:-1]) + 1
+            bounds = np.concatenate(([0], starts, [len(ch)]))
             
             # Compute features for each channel
+            channels: List[str] = []
             all_features: Dict[str, Any] = {}
             
-            for channel in channels:
-                channel_data = df[df["channel"] == channel].sort_values("t")
-                t = channel_data["t"].to_numpy()
-                y = channel_data["y"].to_numpy()
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                channel = ch[start]
+                channels.append(channel)
                 
-                channel_features = compute_timeseries_features(t, y, channel)
+                channel_features = compute_timeseries_features(
+                    t[start:end], y[start:end], channel, assume_sorted=True
+                )
                 all_features.update(channel_features)
             
             # Compute global features
@@ -2,11 +2,13 @@
 
 import math
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import xgboost as xgb
 
+from .config import get_settings
+from .db import LEAF_ENCODING, LEAF_ENCODING_NODE_IDS
 from .models import LoadedModel, ModelConfig
 
 
@@ -19,8 +21,15 @@ class PredictionResult:
     y_hat: float
     threshold: float
     predicted_class: int
-    leaf_indices: List[int]
+    # One leaf id per tree, as a 1-D integer array; orjson (with
+    # OPT_SERIALIZE_NUMPY) writes it straight to JSON, and to_dict()
+    # converts it to a list
+    leaf_indices: np.ndarray
     num_trees: int
+    # Numbering of leaf_indices (db.LEAF_ENCODING or LEAF_ENCODING_NODE_IDS)
+    leaf_encoding: int
+    # ETag of the model bundle that made the prediction, if known
+    model_etag: Optional[str] = None
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization."""
@@ -30,8 +39,10 @@ class PredictionResult:
             "y_hat": self.y_hat,
             "threshold": self.threshold,
             "predicted_class": self.predicted_class,
-            "leaf_indices": self.leaf_indices,
+            "leaf_indices": self.leaf_indices.tolist(),
             "num_trees": self.num_trees,
+            "leaf_encoding": self.leaf_encoding,
+            "model_etag": self.model_etag,
         }
 
 
@@ -77,6 +88,121 @@ def construct_feature_vector(
     return np.array(vector, dtype=np.float32)
 
 
+# feature matrix -> (probabilities, (num_rows, num_trees) leaf ids,
+# leaf id encoding)
+Predictor = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray, int]]
+
+
+def _build_predictor(loaded_model: LoadedModel) -> Predictor:
+    """
+    Build a model's predict function, specialized to the model.
+    
+    Which path applies and the per-model index vectors are settled once
+    here instead of on every call. Leaf indices need a DMatrix
+    prediction; for binary:logistic models (which have a leaf value
+    table) the probabilities are rebuilt from those leaves instead of
+    walking the trees a second time, and a single row on packed trees
+    skips XGBoost entirely. Leaf ids are renumbered 0..L_t-1 per tree
+    when the model has a leaf remap that covers every tree, and left as
+    XGBoost node ids otherwise; the encoding applied is returned with
+    them.
+    """
+    booster = loaded_model.model
+    feature_names = loaded_model.config.feature_order
+    leaf_values = loaded_model.leaf_values
+    leaf_remap = loaded_model.leaf_remap
+    packed = loaded_model.packed
+    
+    def leaf_nodes(feature_matrix: np.ndarray) -> np.ndarray:
+        # Single-threaded like the booster; the inference pool supplies
+        # the parallelism
+        dmatrix = xgb.DMatrix(
+            feature_matrix, feature_names=feature_names, nthread=1
+        )
+        leaf_indices = booster.predict(dmatrix, pred_leaf=True)
+        return leaf_indices.reshape(len(feature_matrix), -1).astype(np.intp)
+    
+    if leaf_values is None or leaf_remap is None:
+        remap_rows = None if leaf_remap is None else np.arange(len(leaf_remap))
+        
+        def predict(
+            feature_matrix: np.ndarray,
+        ) -> Tuple[np.ndarray, np.ndarray, int]:
+            nodes = leaf_nodes(feature_matrix)
+            y_hats = booster.inplace_predict(feature_matrix)
+            if remap_rows is not None and nodes.shape[1] == len(remap_rows):
+                return y_hats, leaf_remap[remap_rows, nodes], LEAF_ENCODING
+            return y_hats, nodes, LEAF_ENCODING_NODE_IDS
+        
+        return predict
+    
+    # binary:logistic: margin = base + sum over trees of each row's leaf value
+    tree_rows = np.arange(len(leaf_values))
+    base_margin = loaded_model.base_margin
+    num_trees = len(leaf_values)
+    
+    def predict_binary_logistic(
+        feature_matrix: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        if packed is not None and len(feature_matrix) == 1:
+            # One row: DMatrix construction and the XGBoost call overhead
+            # dwarf the tree walk itself
+            nodes = np.empty((1, num_trees), dtype=np.intp)
+            leaf_sums = np.array([packed.predict_row(feature_matrix[0], nodes[0])])
+        else:
+            nodes = leaf_nodes(feature_matrix)
+            leaf_sums = leaf_values[tree_rows, nodes].sum(axis=1)
+        
+        margin = base_margin + leaf_sums
+        y_hats = (1.0 / (1.0 + np.exp(-margin))).astype(np.float32)
+        return y_hats, leaf_remap[tree_rows, nodes], LEAF_ENCODING
+    
+    return predict_binary_logistic
+
+
+def _predict_with_leaves(
+    loaded_model: LoadedModel,
+    feature_matrix: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Predict probabilities and leaf indices for a feature matrix.
+    
+    Returns:
+        Tuple of (probabilities, (num_rows, num_trees) leaf ids, leaf id
+        encoding)
+    """
+    predictor = loaded_model.predictor
+    if predictor is None:
+        # Built on first use; a racing thread at worst builds it twice
+        predictor = loaded_model.predictor = _build_predictor(loaded_model)
+    return predictor(feature_matrix)
+
+
+def _quantize_probabilities(y_hats: np.ndarray) -> np.ndarray:
+    """
+    Round probabilities to 4 significant digits (float16-level precision).
+    
+    Sigmoid outputs only need a few digits, and the rounded values are
+    short decimals, so responses and stored rows carry e.g. 0.4958
+    instead of 0.4958496093750000. Values outside (0, 1] (scores from
+    non-probability objectives) are left as is. Only the reported
+    value is rounded; classes are decided on the full-precision score.
+    Disabled by `predict_full_precision`.
+    """
+    if get_settings().predict_full_precision:
+        return y_hats
+    
+    y_hats = y_hats.astype(np.float64)
+    is_probability = (y_hats > 0.0) & (y_hats <= 1.0)
+    
+    # Scale each value by the power of ten that leaves 4 digits before
+    # the point; rounding and dividing back yields the double nearest to
+    # the short decimal
+    digits = 3 - np.floor(np.log10(np.where(is_probability, y_hats, 1.0)))
+    scale = 10.0 ** np.where(is_probability, digits, 0.0)
+    return np.where(is_probability, np.round(y_hats * scale) / scale, y_hats)
+
+
 def run_inference(
     loaded_model: LoadedModel,
     sample_id: str,
@@ -107,27 +233,19 @@ def run_inference(
             feature_order=loaded_model.config.feature_order,
         )
         
-        # Create DMatrix for XGBoost
         # Reshape to (1, n_features) for single sample
-        dmatrix = xgb.DMatrix(
-            feature_vector.reshape(1, -1),
-            feature_names=loaded_model.config.feature_order,
+        y_hat_raw, leaf_indices_raw, leaf_encoding = _predict_with_leaves(
+            loaded_model, feature_vector.reshape(1, -1)
         )
-        
-        # Get probability prediction
-        y_hat_raw = loaded_model.model.predict(dmatrix)
-        y_hat = float(y_hat_raw[0])
+        score = float(y_hat_raw[0])
         
         # Ensure y_hat is valid
-        if math.isnan(y_hat) or math.isinf(y_hat):
-            raise InferenceError(f"Invalid prediction value: {y_hat}")
+        if math.isnan(score) or math.isinf(score):
+            raise InferenceError(f"Invalid prediction value: {score}")
         
-        # Get leaf indices for embedding
-        leaf_indices_raw = loaded_model.model.predict(
-            dmatrix, pred_leaf=True
-        )
-        # Convert to list of Python ints
-        leaf_indices = leaf_indices_raw[0].astype(int).tolist()
+        y_hat = float(_quantize_probabilities(y_hat_raw)[0])
+        
+        leaf_indices = leaf_indices_raw[0]
         
         # Determine threshold and class
         threshold = (
@@ -135,7 +253,7 @@ def run_inference(
             if threshold_override is not None 
             else loaded_model.config.default_threshold
         )
-        predicted_class = 1 if y_hat >= threshold else 0
+        predicted_class = 1 if score >= threshold else 0
         
         return PredictionResult(
             sample_id=sample_id,
@@ -145,6 +263,8 @@ def run_inference(
             predicted_class=predicted_class,
             leaf_indices=leaf_indices,
             num_trees=loaded_model.num_trees,
+            leaf_encoding=leaf_encoding,
+            model_etag=loaded_model.etag,
         )
         
     except xgb.core.XGBoostError as e:
@@ -181,33 +301,40 @@ def run_batch_inference(
         return []
     
     try:
-        # Construct feature matrix
-        feature_vectors = []
+        # Construct feature matrix in place; anything not set stays NaN
+        # so XGBoost routes it as missing
+        feature_index = loaded_model.feature_index
+        feature_matrix = loaded_model.scratch_matrix(len(samples))
         sample_ids = []
         
-        for sample_id, features in samples:
-            vector = construct_feature_vector(
-                features=features,
-                feature_order=loaded_model.config.feature_order,
-            )
-            feature_vectors.append(vector)
+        # Gather (row, column, value) triples with plain list appends and
+        # scatter them in one vectorized assignment; per-cell numpy
+        # __setitem__ calls cost more than the dict walk itself
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[float] = []
+        
+        for i, (sample_id, features) in enumerate(samples):
             sample_ids.append(sample_id)
+            for feature_name, value in features.items():
+                j = feature_index.get(feature_name)
+                if j is None or value is None:
+                    continue
+                try:
+                    values.append(float(value))
+                except (ValueError, TypeError):
+                    # Non-numeric values treated as missing
+                    continue
+                rows.append(i)
+                cols.append(j)
         
-        # Stack into matrix
-        feature_matrix = np.vstack(feature_vectors)
+        feature_matrix[rows, cols] = values
         
-        # Create DMatrix
-        dmatrix = xgb.DMatrix(
-            feature_matrix,
-            feature_names=loaded_model.config.feature_order,
+        # Get probability predictions and leaf indices
+        y_hats, leaf_indices_matrix, leaf_encoding = _predict_with_leaves(
+            loaded_model, feature_matrix
         )
         
-        # Get probability predictions
-        y_hats = loaded_model.model.predict(dmatrix)
-        
-        # Get leaf indices
-        leaf_indices_matrix = loaded_model.model.predict(dmatrix, pred_leaf=True)
-        
         # Determine threshold
         threshold = (
             threshold_override 
@@ -215,14 +342,14 @@ def run_batch_inference(
             else loaded_model.config.default_threshold
         )
         
+        # Classify on the unrounded scores, then convert to Python values
+        # in bulk rather than per sample; leaf ids stay as array rows
+        class_list = (y_hats >= threshold).astype(np.int8).tolist()
+        y_hat_list = _quantize_probabilities(y_hats).tolist()
+        
         # Build results
-        results = []
-        for i, sample_id in enumerate(sample_ids):
-            y_hat = float(y_hats[i])
-            leaf_indices = leaf_indices_matrix[i].astype(int).tolist()
-            predicted_class = 1 if y_hat >= threshold else 0
-            
-            results.append(PredictionResult(
+        return [
+            PredictionResult(
                 sample_id=sample_id,
                 model_id=model_id,
                 y_hat=y_hat,
@@ -230,9 +357,13 @@ def run_batch_inference(
                 predicted_class=predicted_class,
                 leaf_indices=leaf_indices,
                 num_trees=loaded_model.num_trees,
-            ))
-        
-        return results
+                leaf_encoding=leaf_encoding,
+                model_etag=loaded_model.etag,
+            )
+            for sample_id, y_hat, predicted_class, leaf_indices in zip(
+                sample_ids, y_hat_list, class_list, leaf_indices_matrix
+            )
+        ]
         
     except xgb.core.XGBoostError as e:
         raise InferenceError(f"XGBoost batch prediction failed: {e}")
@@ -1,8 +1,9 @@
 """FastAPI application for the ML worker service."""
 
-import threading
+import multiprocessing
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional
 
@@ -12,8 +13,8 @@ from .db import get_job
 from .routes import predict_router
 
 
-# Background consumer thread
-consumer_thread: Optional[threading.Thread] = None
+# Background consumer process
+consumer_process: Optional[multiprocessing.Process] = None
 
 
 def check_xgboost_available() -> bool:
@@ -28,18 +29,28 @@ def check_xgboost_available() -> bool:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler - starts consumer on startup."""
-    global consumer_thread
+    global consumer_process
     
-    # Start the consumer in a background thread
-    consumer_thread = threading.Thread(target=start_consumer, daemon=True)
-    consumer_thread.start()
+    # Run the consumer in its own process so CPU-bound jobs don't compete
+    # with request handling for the GIL. Spawned rather than forked, so
+    # the child imports xgboost/numba fresh instead of inheriting this
+    # process's threads and library state.
+    consumer_process = multiprocessing.get_context("spawn").Process(
+        target=start_consumer, name="job-consumer", daemon=True
+    )
+    consumer_process.start()
     
-    print("Worker started - consumer running in background")
+    print("Worker started - consumer running in background process")
     
     yield
     
-    # Cleanup on shutdown
+    # Cleanup on shutdown: SIGTERM the consumer, then kill it if it hangs
     print("Worker shutting down")
+    consumer_process.terminate()
+    consumer_process.join(timeout=10)
+    if consumer_process.is_alive():
+        consumer_process.kill()
+        consumer_process.join()
 
 
 app = FastAPI(
@@ -47,6 +58,7 @@ app = FastAPI(
     description="ML worker service for feature extraction and XGBoost inference",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Register prediction routes
@@ -1,17 +1,25 @@
 """Model bundle loading and caching utilities."""
 
 import json
+import math
 import tempfile
+import threading
+import time
 import zipfile
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from functools import lru_cache
-from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import xgboost as xgb
+from botocore.exceptions import ClientError
 
-from .s3 import download_file
+from .config import get_settings
+from .db import clear_model_cache
+from .packed import PackedEnsemble, pack_booster
+from .s3 import download_file_spooled, get_object_etag, open_range_reader
 
 
 @dataclass
@@ -43,6 +51,61 @@ class LoadedModel:
     model: xgb.Booster
     config: ModelConfig
     num_trees: int
+    # (num_trees, max_node_id + 1) leaf values and the base margin, when
+    # the probability can be rebuilt from leaf indices (binary:logistic)
+    leaf_values: Optional[np.ndarray] = None
+    base_margin: float = 0.0
+    # (num_trees, max_node_id + 1) map from XGBoost leaf node id to the
+    # leaf's position (0..L_t-1) within its tree
+    leaf_remap: Optional[np.ndarray] = None
+    # Trees packed for fast single-row prediction (binary:logistic only)
+    packed: Optional[PackedEnsemble] = None
+    # S3 ETag of the bundle the model was loaded from (set by the cache)
+    etag: Optional[str] = None
+    # Predict function specialized to this model, built by the inference
+    # module on first use
+    predictor: Optional[
+        Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray, int]]
+    ] = field(default=None, init=False, repr=False)
+    # feature name -> column in the model's feature matrix
+    feature_index: Dict[str, int] = field(init=False, repr=False)
+    # Per-thread feature matrix buffers reused across batches
+    _scratch: threading.local = field(
+        init=False, repr=False, default_factory=threading.local
+    )
+    
+    def __post_init__(self):
+        self.feature_index = {
+            name: i for i, name in enumerate(self.config.feature_order)
+        }
+        # A repeated name would map two model columns to one feature
+        if len(self.feature_index) != len(self.config.feature_order):
+            duplicates = sorted({
+                name for name in self.config.feature_order
+                if self.config.feature_order.count(name) > 1
+            })
+            raise ModelBundleError(
+                f"feature_order has duplicate feature names: {duplicates}"
+            )
+    
+    def scratch_matrix(self, num_rows: int) -> np.ndarray:
+        """
+        Get an all-NaN (num_rows, num_features) float32 matrix to fill.
+        
+        The buffer belongs to the calling thread and is reused by its next
+        call, so the result must not be kept once the prediction is done.
+        Each inference thread has its own buffer, so concurrent batches do
+        not need a lock.
+        """
+        buffer = getattr(self._scratch, "buffer", None)
+        if buffer is None or len(buffer) < num_rows:
+            buffer = np.empty(
+                (num_rows, len(self.config.feature_order)), dtype=np.float32
+            )
+            self._scratch.buffer = buffer
+        view = buffer[:num_rows]
+        view.fill(np.nan)
+        return view
     
     @property
     def feature_names(self) -> List[str]:
@@ -55,7 +118,10 @@ class ModelBundleError(Exception):
     pass
 
 
-def load_model_bundle(storage_key: str) -> LoadedModel:
+def load_model_bundle(
+    storage_key: str,
+    etag: Optional[str] = None,
+) -> LoadedModel:
     """
     Download and load a model bundle from S3.
     
@@ -65,6 +131,7 @@ def load_model_bundle(storage_key: str) -> LoadedModel:
     
     Args:
         storage_key: S3 key to the model bundle zip
+        etag: If given, load the bundle only if its ETag still matches
         
     Returns:
         LoadedModel with XGBoost booster and configuration
@@ -73,25 +140,18 @@ def load_model_bundle(storage_key: str) -> LoadedModel:
         ModelBundleError: If bundle is invalid or missing required files
     """
     try:
-        # Download bundle from S3
-        bundle_bytes = download_file(storage_key)
-        bundle_io = BytesIO(bundle_bytes)
-        
-        # Extract and load from zip
-        with zipfile.ZipFile(bundle_io, "r") as zf:
+        # Download bundle from S3 (spooled, so big bundles go to disk)
+        # and extract only the members we need
+        with download_file_spooled(storage_key, if_match=etag) as bundle_file, \
+                zipfile.ZipFile(bundle_file, "r") as zf:
             # List files in bundle
             file_names = zf.namelist()
             
             # Find model file (prefer JSON over UBJ)
-            model_file = None
-            model_format = None
-            
             if "xgb_model.json" in file_names:
                 model_file = "xgb_model.json"
-                model_format = "json"
             elif "xgb_model.ubj" in file_names:
                 model_file = "xgb_model.ubj"
-                model_format = "ubj"
             else:
                 raise ModelBundleError(
                     "Model bundle must contain xgb_model.json or xgb_model.ubj"
@@ -118,30 +178,30 @@ def load_model_bundle(storage_key: str) -> LoadedModel:
             config = ModelConfig.from_dict(config_data)
             
             # Load XGBoost model
-            # XGBoost requires a file path, so we need to write to temp file
-            model_bytes = zf.read(model_file)
-            
-            with tempfile.NamedTemporaryFile(
-                suffix=f".{model_format}", delete=False
-            ) as tmp:
-                tmp.write(model_bytes)
-                tmp.flush()
-                tmp_path = tmp.name
-            
-            try:
-                booster = xgb.Booster()
-                booster.load_model(tmp_path)
-            finally:
-                # Clean up temp file
-                Path(tmp_path).unlink(missing_ok=True)
+            booster = _load_booster(zf.read(model_file), Path(model_file).suffix)
+            
+            # Predict single-threaded; requests run in parallel on the
+            # inference pool, and nested XGBoost threads would fight it
+            booster.set_param({"nthread": 1})
             
             # Get number of trees
             num_trees = _get_num_trees(booster)
             
+            trees = _dump_leaves(booster)
+            leaf_table = _build_leaf_value_table(booster, trees)
+            leaf_values, base_margin = leaf_table or (None, 0.0)
+            
             return LoadedModel(
                 model=booster,
                 config=config,
                 num_trees=num_trees,
+                leaf_values=leaf_values,
+                base_margin=base_margin,
+                leaf_remap=_build_leaf_remap(trees),
+                packed=(
+                    pack_booster(booster, config.feature_order)
+                    if leaf_table else None
+                ),
             )
             
     except zipfile.BadZipFile:
@@ -150,6 +210,37 @@ def load_model_bundle(storage_key: str) -> LoadedModel:
         raise ModelBundleError(f"Invalid model_config.json: {e}")
     except xgb.core.XGBoostError as e:
         raise ModelBundleError(f"Failed to load XGBoost model: {e}")
+    except ClientError as e:
+        # Includes a failed IfMatch (412) when the bundle was replaced
+        raise ModelBundleError(f"Model bundle not available: {e}")
+
+
+def _load_booster(model_bytes: bytes, suffix: str) -> xgb.Booster:
+    """
+    Load a booster from raw model bytes.
+    
+    Loads straight from memory (JSON vs UBJ is detected from the bytes).
+    Falls back to a temp file, whose suffix tells XGBoost the format, for
+    builds that cannot load from a buffer.
+    """
+    booster = xgb.Booster()
+    try:
+        booster.load_model(bytearray(model_bytes))
+        return booster
+    except xgb.core.XGBoostError:
+        pass
+    
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(model_bytes)
+        tmp_path = tmp.name
+    
+    try:
+        booster = xgb.Booster()
+        booster.load_model(tmp_path)
+    finally:
+        # Clean up temp file
+        Path(tmp_path).unlink(missing_ok=True)
+    return booster
 
 
 def _get_num_trees(booster: xgb.Booster) -> int:
@@ -168,61 +259,226 @@ def _get_num_trees(booster: xgb.Booster) -> int:
             return 0
 
 
-# Simple in-memory cache for loaded models
-# Key: (org_id, model_id), Value: LoadedModel
-_model_cache: Dict[str, LoadedModel] = {}
+def _dump_leaves(booster: xgb.Booster) -> List[Dict[int, float]]:
+    """Get each tree's {leaf node id: leaf value}, in prediction order."""
+    return [
+        dict(_iter_leaves(json.loads(dump)))
+        for dump in booster.get_dump(dump_format="json")
+    ]
+
+
+def _build_leaf_value_table(
+    booster: xgb.Booster,
+    trees: List[Dict[int, float]],
+) -> Optional[Tuple[np.ndarray, float]]:
+    """
+    Build a per-tree leaf value table and the model's base margin.
+    
+    With it, a binary:logistic model's probability can be computed
+    from its leaf indices, so inference walks the trees once (for the
+    leaves) instead of twice. Returns None for models it can't
+    represent: other objectives, non-tree boosters, multi-output.
+    """
+    try:
+        learner = json.loads(booster.save_config())["learner"]
+        model_param = learner["learner_model_param"]
+        gbtree_param = learner["gradient_booster"].get("gbtree_model_param", {})
+        if (
+            learner["objective"]["name"] != "binary:logistic"
+            or learner["gradient_booster"]["name"] != "gbtree"
+            or model_param.get("num_class", "0") != "0"
+            or model_param.get("num_target", "1") != "1"
+            or gbtree_param.get("num_parallel_tree", "1") != "1"
+        ):
+            return None
+        
+        base_score = float(model_param["base_score"])
+        if not 0.0 < base_score < 1.0:
+            return None
+        
+        if not trees:
+            return None
+        
+        width = max(max(leaves) for leaves in trees) + 1
+        table = np.zeros((len(trees), width), dtype=np.float64)
+        for t, leaves in enumerate(trees):
+            table[t, list(leaves)] = list(leaves.values())
+        
+        return table, math.log(base_score / (1.0 - base_score))
+    except Exception:
+        # Unexpected config/dump layout; inference uses the booster instead
+        return None
+
+
+def _build_leaf_remap(trees: List[Dict[int, float]]) -> Optional[np.ndarray]:
+    """
+    Build a per-tree map from leaf node id to a consecutive leaf id.
+    
+    XGBoost numbers leaves with the tree's node ids, which are sparse
+    and grow with depth. Renumbering each tree's leaves 0..L_t-1 (in
+    node id order) keeps stored leaf embeddings small. Non-leaf slots
+    are -1.
+    """
+    if not trees:
+        return None
+    
+    width = max(max(leaves) for leaves in trees) + 1
+    most_leaves = max(len(leaves) for leaves in trees)
+    dtype = np.int16 if most_leaves < 2 ** 15 else np.int32
+    
+    remap = np.full((len(trees), width), -1, dtype=dtype)
+    for t, leaves in enumerate(trees):
+        node_ids = sorted(leaves)
+        remap[t, node_ids] = np.arange(len(node_ids))
+    return remap
+
+
+def _iter_leaves(node: Dict[str, Any]) -> Iterator[Tuple[int, float]]:
+    """Yield (node_id, leaf_value) for every leaf under a dumped tree node."""
+    if "leaf" in node:
+        yield node["nodeid"], node["leaf"]
+    else:
+        for child in node["children"]:
+            yield from _iter_leaves(child)
+
+
+@dataclass
+class _CachedModel:
+    """A loaded model and the bundle version it was loaded from."""
+    
+    etag: str
+    model: LoadedModel
+    checked_at: float
+
+
+# Loaded models, least recently used first
+# Key: model_id, Value: model plus the S3 ETag of its bundle
+_model_cache: "OrderedDict[str, _CachedModel]" = OrderedDict()
+_model_cache_lock = threading.Lock()
+
+# One lock per model_id being revalidated or loaded, so concurrent misses
+# share a single load; removed once that load is done
+_model_load_locks: Dict[str, threading.Lock] = {}
 
 
 def get_cached_model(model_id: str, storage_key: str) -> LoadedModel:
     """
     Get a model from cache or load it.
     
+    The cache holds at most `bundle_cache_size` models. A cached model
+    is revalidated against the bundle's S3 ETag (a HEAD request, no
+    download) at most every `bundle_cache_revalidate_seconds`, so a
+    re-uploaded bundle replaces the stale model. Revalidation and
+    loading are single-flight per model: concurrent requests wait for
+    the one in progress and reuse its result.
+    
     Args:
         model_id: UUID of the model (used as cache key)
         storage_key: S3 key to model bundle
-        
+    
     Returns:
         LoadedModel instance
+    
+    Raises:
+        ModelBundleError: If the bundle is missing or invalid
     """
-    if model_id not in _model_cache:
-        _model_cache[model_id] = load_model_bundle(storage_key)
-    return _model_cache[model_id]
+    settings = get_settings()
+    
+    with _model_cache_lock:
+        cached = _model_cache.get(model_id)
+        if cached is not None:
+            _model_cache.move_to_end(model_id)
+            if time.monotonic() - cached.checked_at < settings.bundle_cache_revalidate_seconds:
+                return cached.model
+        load_lock = _model_load_locks.setdefault(model_id, threading.Lock())
+    
+    with load_lock:
+        try:
+            return _revalidate_or_load(model_id, storage_key)
+        finally:
+            # Requests arriving after this find the model fresh in the
+            # cache, so the lock is no longer needed
+            with _model_cache_lock:
+                if _model_load_locks.get(model_id) is load_lock:
+                    del _model_load_locks[model_id]
+
+
+def _revalidate_or_load(model_id: str, storage_key: str) -> LoadedModel:
+    """Revalidate or (re)load a cached model; called holding its load lock."""
+    settings = get_settings()
+    
+    # Another request may have revalidated or loaded it while we waited
+    with _model_cache_lock:
+        cached = _model_cache.get(model_id)
+        if cached is not None and (
+            time.monotonic() - cached.checked_at
+            < settings.bundle_cache_revalidate_seconds
+        ):
+            return cached.model
+    
+    try:
+        etag = get_object_etag(storage_key)
+    except ClientError as e:
+        raise ModelBundleError(f"Model bundle not available: {e}")
+    
+    now = time.monotonic()
+    if cached is not None and cached.etag == etag:
+        cached.checked_at = now
+        return cached.model
+    
+    # Download only the version just checked, so a concurrent re-upload
+    # can't be cached under the old ETag
+    loaded_model = load_model_bundle(storage_key, etag=etag)
+    loaded_model.etag = etag
+    
+    with _model_cache_lock:
+        _model_cache[model_id] = _CachedModel(etag, loaded_model, now)
+        _model_cache.move_to_end(model_id)
+        while len(_model_cache) > settings.bundle_cache_size:
+            _model_cache.popitem(last=False)
+    
+    return loaded_model
 
 
 def invalidate_model_cache(model_id: Optional[str] = None) -> None:
     """
     Invalidate model cache.
     
+    Also drops cached model registry rows, so a re-activated or
+    re-uploaded model is read fresh from the database.
+    
     Args:
         model_id: Specific model to invalidate, or None to clear all
     """
-    global _model_cache
-    if model_id is None:
-        _model_cache = {}
-    elif model_id in _model_cache:
-        del _model_cache[model_id]
+    clear_model_cache()
+    with _model_cache_lock:
+        if model_id is None:
+            _model_cache.clear()
+        else:
+            _model_cache.pop(model_id, None)
 
 
 def validate_model_bundle(storage_key: str) -> Dict[str, Any]:
     """
     Validate a model bundle without fully loading it.
     
+    Only the zip's central directory and model_config.json are fetched
+    (via S3 Range reads), not the model file itself.
+    
     Returns metadata about the bundle if valid.
     
     Args:
         storage_key: S3 key to the model bundle zip
-        
+    
     Returns:
         Dictionary with bundle metadata
-        
+    
     Raises:
         ModelBundleError: If bundle is invalid
     """
     try:
-        bundle_bytes = download_file(storage_key)
-        bundle_io = BytesIO(bundle_bytes)
-        
-        with zipfile.ZipFile(bundle_io, "r") as zf:
+        with open_range_reader(storage_key) as bundle_file, \
+                zipfile.ZipFile(bundle_file, "r") as zf:
             file_names = zf.namelist()
             
             # Check for required files
@@ -248,8 +504,10 @@ def validate_model_bundle(storage_key: str) -> Dict[str, Any]:
                 "config": config_data,
                 "files": file_names,
             }
-            
+    
     except zipfile.BadZipFile:
         raise ModelBundleError("Invalid model bundle: not a valid zip file")
     except json.JSONDecodeError as e:
         raise ModelBundleError(f"Invalid model_config.json: {e}")
+    except ClientError as e:
+        raise ModelBundleError(f"Model bundle not available: {e}")
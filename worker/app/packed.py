@@ -0,0 +1,168 @@
+"""Packed tree ensembles for fast single-row prediction."""
+
+import json
+import math
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+import xgboost as xgb
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; without it XGBoost predicts every row
+    njit = None
+
+
+@dataclass
+class PackedEnsemble:
+    """
+    A tree ensemble flattened into node arrays.
+    
+    Every tree's nodes are laid end to end, in XGBoost's own node order,
+    so tree t's node i sits at `tree_roots[t] + i`. Child links are flat
+    indices into the same arrays. At leaves `split_feature` is -1 and
+    `split_value` holds the leaf value.
+    """
+    
+    tree_roots: np.ndarray      # (num_trees,) int32
+    split_feature: np.ndarray   # (num_nodes,) int32
+    split_value: np.ndarray     # (num_nodes,) float32
+    left: np.ndarray            # (num_nodes,) int32
+    right: np.ndarray           # (num_nodes,) int32
+    missing: np.ndarray         # (num_nodes,) int32
+    
+    @property
+    def num_trees(self) -> int:
+        return len(self.tree_roots)
+    
+    def predict_row(self, row: np.ndarray, leaves_out: np.ndarray) -> float:
+        """
+        Walk every tree for one float32 feature row.
+        
+        Writes each tree's leaf node id (as XGBoost numbers it) into
+        `leaves_out` and returns the sum of the leaf values.
+        """
+        return _predict_row(
+            row,
+            self.tree_roots,
+            self.split_feature,
+            self.split_value,
+            self.left,
+            self.right,
+            self.missing,
+            leaves_out,
+        )
+
+
+def _predict_row_kernel(
+    row: np.ndarray,
+    tree_roots: np.ndarray,
+    split_feature: np.ndarray,
+    split_value: np.ndarray,
+    left: np.ndarray,
+    right: np.ndarray,
+    missing: np.ndarray,
+    leaves_out: np.ndarray,
+) -> float:
+    """
+    Tree walk for PackedEnsemble.predict_row, as loops for numba.
+    
+    Follows XGBoost's rule: NaN takes the default branch, otherwise
+    go left when the value is below the split.
+    """
+    total = 0.0
+    for t in range(tree_roots.shape[0]):
+        root = tree_roots[t]
+        node = root
+        while split_feature[node] >= 0:
+            x = row[split_feature[node]]
+            if math.isnan(x):
+                node = missing[node]
+            elif x < split_value[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        leaves_out[t] = node - root
+        total += split_value[node]
+    return total
+
+
+if njit is not None:
+    _predict_row = njit(cache=True)(_predict_row_kernel)
+else:
+    _predict_row = None
+
+
+def pack_booster(
+    booster: xgb.Booster,
+    feature_order: List[str],
+) -> Optional[PackedEnsemble]:
+    """
+    Pack a booster's trees for single-row prediction.
+    
+    Reads the trees from the booster's saved JSON model, whose per-tree
+    arrays are already in node order. Returns None when numba is not
+    available (the packed walk would be slower than XGBoost) or the
+    trees use something the walk doesn't handle (categorical splits,
+    feature names that differ from the model's feature order).
+    """
+    if _predict_row is None:
+        return None
+    
+    # XGBoost rejects rows whose names don't match; the walk can't check
+    if booster.feature_names and list(booster.feature_names) != feature_order:
+        return None
+    num_features = len(feature_order)
+    
+    try:
+        model = json.loads(booster.save_raw("json"))
+        trees = model["learner"]["gradient_booster"]["model"]["trees"]
+        if not trees:
+            return None
+        
+        roots, features, values, lefts, rights, missings = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            if any(tree["split_type"]):
+                return None
+            
+            left = np.asarray(tree["left_children"], dtype=np.int32)
+            right = np.asarray(tree["right_children"], dtype=np.int32)
+            is_leaf = left == -1
+            
+            feature = np.asarray(tree["split_indices"], dtype=np.int32)
+            feature[is_leaf] = -1
+            if feature.max(initial=-1) >= num_features:
+                return None
+            
+            default_left = np.asarray(tree["default_left"], dtype=bool)
+            
+            roots.append(offset)
+            features.append(feature)
+            values.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+            lefts.append(np.where(is_leaf, -1, left + offset))
+            rights.append(np.where(is_leaf, -1, right + offset))
+            missings.append(
+                np.where(is_leaf, -1, np.where(default_left, left, right) + offset)
+            )
+            offset += len(left)
+        
+        packed = PackedEnsemble(
+            tree_roots=np.asarray(roots, dtype=np.int32),
+            split_feature=np.concatenate(features),
+            split_value=np.concatenate(values),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            missing=np.concatenate(missings).astype(np.int32),
+        )
+        
+        # Compile the kernel now rather than on the first request
+        packed.predict_row(
+            np.full(num_features, np.nan, dtype=np.float32),
+            np.empty(packed.num_trees, dtype=np.intp),
+        )
+        return packed
+    except Exception:
+        # Unexpected model layout; inference uses the booster instead
+        return None
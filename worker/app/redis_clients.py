@@ -0,0 +1,39 @@
+"""Upstash Redis clients, one per workload."""
+
+from functools import lru_cache
+
+from upstash_redis import Redis
+from upstash_redis.asyncio import Redis as AsyncRedis
+
+from .config import get_settings
+
+
+@lru_cache(maxsize=None)
+def get_queue_redis() -> AsyncRedis:
+    """
+    Get cached async Upstash Redis client for the job queue.
+    
+    Reserved for blocking pops so a long BLMPOP never delays other
+    Redis traffic. Enter it with `async with` inside the consumer's
+    event loop so one HTTP session is reused for every pop.
+    """
+    settings = get_settings()
+    return AsyncRedis(
+        url=settings.upstash_redis_rest_url,
+        token=settings.upstash_redis_rest_token,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_cache_redis() -> Redis:
+    """
+    Get cached Upstash Redis client for short, non-blocking commands.
+    
+    Has its own HTTP session, separate from the queue client, so cache
+    reads and status writes never wait behind a blocking pop.
+    """
+    settings = get_settings()
+    return Redis(
+        url=settings.upstash_redis_rest_url,
+        token=settings.upstash_redis_rest_token,
+    )
@@ -1,16 +1,24 @@
 """XGBoost prediction endpoints."""
 
-from typing import List, Optional
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
 from ..db import (
+    db_session,
     get_model,
     get_sample,
+    get_samples_by_ids,
     get_sample_features_by_feature_set,
+    get_sample_features_by_sample_ids,
+    get_current_predictions,
     get_samples_for_experiment,
     upsert_prediction,
+    upsert_predictions_batch,
     upsert_leaf_embedding,
+    upsert_leaf_embeddings_batch,
     create_predict_job,
     update_job_status,
 )
@@ -19,11 +27,13 @@ from ..models import (
     ModelBundleError,
 )
 from ..inference import (
-    run_inference,
     run_batch_inference,
     InferenceError,
+    PredictionResult,
 )
+from ..batching import get_batch_scheduler, get_predict_executor
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1", tags=["predictions"])
 
@@ -51,6 +61,8 @@ class PredictResponse(BaseModel):
     threshold: float
     predicted_class: int
     num_trees: int
+    # True when an existing, still-current prediction was returned
+    cached: bool = False
 
 
 class PredictBatchResponse(BaseModel):
@@ -99,11 +111,17 @@ async def predict_xgboost(request: PredictRequest):
     job_id = None
     
     try:
-        # Create job record for audit
-        job_id = create_predict_job(org_id, sample_id, model_id)
+        # Create job record for audit (committed on its own so a failed
+        # prediction still leaves a job row to mark as failed)
+        job_id = await asyncio.to_thread(
+            create_predict_job, org_id, sample_id, model_id
+        )
+        
+        # 1-3. Verify model and sample, and get the sample's features
+        model, sample, sample_features = await asyncio.to_thread(
+            _load_predict_inputs, org_id, sample_id, model_id
+        )
         
-        # 1. Verify and get model (defense in depth - verify org ownership)
-        model = get_model(model_id, org_id)
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -113,8 +131,6 @@ async def predict_xgboost(request: PredictRequest):
                 ).model_dump()
             )
         
-        # 2. Verify and get sample
-        sample = get_sample(sample_id, org_id)
         if not sample:
             raise HTTPException(
                 status_code=404,
@@ -124,13 +140,6 @@ async def predict_xgboost(request: PredictRequest):
                 ).model_dump()
             )
         
-        # 3. Get sample features for the model's feature set
-        sample_features = get_sample_features_by_feature_set(
-            sample_id=sample_id,
-            feature_set_id=model["feature_set_id"],
-            org_id=org_id,
-        )
-        
         if not sample_features:
             raise HTTPException(
                 status_code=400,
@@ -142,7 +151,9 @@ async def predict_xgboost(request: PredictRequest):
         
         # 4. Load model bundle (uses cache)
         try:
-            loaded_model = get_cached_model(model_id, model["storage_key"])
+            loaded_model = await asyncio.to_thread(
+                get_cached_model, model_id, model["storage_key"]
+            )
         except ModelBundleError as e:
             raise HTTPException(
                 status_code=500,
@@ -152,12 +163,12 @@ async def predict_xgboost(request: PredictRequest):
                 ).model_dump()
             )
         
-        # 5. Run inference
+        # 5. Run inference (batched with concurrent requests for this model)
         try:
-            result = run_inference(
+            result = await get_batch_scheduler().submit(
                 loaded_model=loaded_model,
-                sample_id=sample_id,
                 model_id=model_id,
+                sample_id=sample_id,
                 features=sample_features["features"],
             )
         except InferenceError as e:
@@ -169,35 +180,9 @@ async def predict_xgboost(request: PredictRequest):
                 ).model_dump()
             )
         
-        # 6. Upsert prediction and leaf embedding
-        upsert_prediction(
-            org_id=org_id,
-            sample_id=sample_id,
-            model_id=model_id,
-            y_hat=result.y_hat,
-            threshold=result.threshold,
-            predicted_class=result.predicted_class,
-        )
-        
-        upsert_leaf_embedding(
-            org_id=org_id,
-            sample_id=sample_id,
-            model_id=model_id,
-            leaf_indices=result.leaf_indices,
-        )
-        
-        # Update job as succeeded
-        if job_id:
-            update_job_status(
-                job_id=job_id,
-                status="succeeded",
-                output={
-                    "y_hat": result.y_hat,
-                    "threshold": result.threshold,
-                    "predicted_class": result.predicted_class,
-                    "num_trees": result.num_trees,
-                }
-            )
+        # 6. Upsert prediction and leaf embedding and mark the job
+        # succeeded in one transaction
+        await asyncio.to_thread(_save_prediction, org_id, job_id, result)
         
         return PredictResponse(
             status="ok",
@@ -212,12 +197,16 @@ async def predict_xgboost(request: PredictRequest):
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         if job_id:
-            update_job_status(job_id=job_id, status="failed", error="HTTP error")
+            await asyncio.to_thread(
+                update_job_status, job_id=job_id, status="failed", error="HTTP error"
+            )
         raise
     except Exception as e:
         # Log and return generic error
         if job_id:
-            update_job_status(job_id=job_id, status="failed", error=str(e))
+            await asyncio.to_thread(
+                update_job_status, job_id=job_id, status="failed", error=str(e)
+            )
         raise HTTPException(
             status_code=500,
             detail=ErrorResponse(
@@ -241,7 +230,9 @@ async def predict_xgboost_batch(request: PredictBatchRequest):
     Run XGBoost prediction on multiple samples.
     
     This endpoint processes samples in batch for efficiency.
-    Individual sample failures don't fail the entire batch.
+    Individual sample failures don't fail the entire batch. Samples with
+    a current prediction are returned from the DB (cached=True) without
+    running inference again.
     """
     org_id = request.org_id
     model_id = request.model_id
@@ -256,7 +247,7 @@ async def predict_xgboost_batch(request: PredictBatchRequest):
         )
     
     # 1. Verify and get model
-    model = get_model(model_id, org_id)
+    model = await asyncio.to_thread(get_model, model_id, org_id)
     if not model:
         raise HTTPException(
             status_code=404,
@@ -268,7 +259,9 @@ async def predict_xgboost_batch(request: PredictBatchRequest):
     
     # 2. Load model bundle
     try:
-        loaded_model = get_cached_model(model_id, model["storage_key"])
+        loaded_model = await asyncio.to_thread(
+            get_cached_model, model_id, model["storage_key"]
+        )
     except ModelBundleError as e:
         raise HTTPException(
             status_code=500,
@@ -278,81 +271,60 @@ async def predict_xgboost_batch(request: PredictBatchRequest):
             ).model_dump()
         )
     
-    # 3. Collect samples and their features
-    samples_to_predict = []
-    errors = []
+    # 3. Collect samples and their features, skipping samples that
+    # already have a current prediction
+    samples_to_predict, cached, errors = await asyncio.to_thread(
+        _collect_batch_samples,
+        org_id,
+        model_id,
+        loaded_model.etag,
+        sample_ids,
+        model["feature_set_id"],
+        loaded_model.config.default_threshold,
+    )
     
-    for sample_id in sample_ids:
-        # Verify sample
-        sample = get_sample(sample_id, org_id)
-        if not sample:
-            errors.append({
-                "sample_id": sample_id,
-                "error": "Sample not found or access denied"
-            })
-            continue
-        
-        # Get features
-        sample_features = get_sample_features_by_feature_set(
+    # Responses keyed by sample ID, returned in the request's order
+    responses = {
+        sample_id: PredictResponse(
+            status="ok",
             sample_id=sample_id,
-            feature_set_id=model["feature_set_id"],
-            org_id=org_id,
+            model_id=model_id,
+            y_hat=prediction["y_hat"],
+            threshold=prediction["threshold"],
+            predicted_class=prediction["predicted_class"],
+            num_trees=loaded_model.num_trees,
+            cached=True,
         )
-        
-        if not sample_features:
-            errors.append({
-                "sample_id": sample_id,
-                "error": "Features not found for required feature set"
-            })
-            continue
-        
-        samples_to_predict.append((sample_id, sample_features["features"]))
+        for sample_id, prediction in cached.items()
+    }
     
     # 4. Run batch inference
-    results = []
-    
     if samples_to_predict:
         try:
-            prediction_results = run_batch_inference(
-                loaded_model=loaded_model,
-                model_id=model_id,
-                samples=samples_to_predict,
+            # CPU-bound, so it runs on the inference pool
+            prediction_results = await asyncio.get_running_loop().run_in_executor(
+                get_predict_executor(),
+                run_batch_inference,
+                loaded_model,
+                model_id,
+                samples_to_predict,
             )
             
             # 5. Upsert results and build response
-            for result in prediction_results:
-                try:
-                    upsert_prediction(
-                        org_id=org_id,
-                        sample_id=result.sample_id,
-                        model_id=model_id,
-                        y_hat=result.y_hat,
-                        threshold=result.threshold,
-                        predicted_class=result.predicted_class,
-                    )
-                    
-                    upsert_leaf_embedding(
-                        org_id=org_id,
-                        sample_id=result.sample_id,
-                        model_id=model_id,
-                        leaf_indices=result.leaf_indices,
-                    )
-                    
-                    results.append(PredictResponse(
-                        status="ok",
-                        sample_id=result.sample_id,
-                        model_id=model_id,
-                        y_hat=result.y_hat,
-                        threshold=result.threshold,
-                        predicted_class=result.predicted_class,
-                        num_trees=result.num_trees,
-                    ))
-                except Exception as e:
-                    errors.append({
-                        "sample_id": result.sample_id,
-                        "error": f"Failed to save prediction: {str(e)}"
-                    })
-                    
+            saved = await asyncio.to_thread(
+                _save_batch_results, org_id, model_id, prediction_results, errors
+            )
+            for result in saved:
+                responses[result.sample_id] = PredictResponse(
+                    status="ok",
+                    sample_id=result.sample_id,
+                    model_id=model_id,
+                    y_hat=result.y_hat,
+                    threshold=result.threshold,
+                    predicted_class=result.predicted_class,
+                    num_trees=result.num_trees,
+                )
+            
         except InferenceError as e:
             # Batch inference failed entirely
             raise HTTPException(
@@ -363,6 +335,10 @@ async def predict_xgboost_batch(request: PredictBatchRequest):
                 ).model_dump()
             )
     
+    results = [
+        responses[sample_id] for sample_id in sample_ids if sample_id in responses
+    ]
+    
     return PredictBatchResponse(
         status="ok",
         model_id=model_id,
@@ -372,3 +348,231 @@ async def predict_xgboost_batch(request: PredictBatchRequest):
         results=results,
         errors=errors,
     )
+
+
+def _save_batch_results(
+    org_id: str,
+    model_id: str,
+    prediction_results: List[PredictionResult],
+    errors: List[dict],
+) -> List[PredictionResult]:
+    """
+    Persist batch predictions and leaf embeddings.
+    
+    Writes everything with two bulk upserts in one transaction. If that
+    fails, retries row by row (each in its own transaction) so one bad
+    row only fails its own sample; those failures are appended to
+    `errors`.
+    
+    Returns:
+        The results that were saved
+    """
+    try:
+        with db_session() as session:
+            upsert_predictions_batch(
+                [
+                    {
+                        "org_id": org_id,
+                        "sample_id": result.sample_id,
+                        "model_id": model_id,
+                        "y_hat": result.y_hat,
+                        "threshold": result.threshold,
+                        "predicted_class": result.predicted_class,
+                        "model_etag": result.model_etag,
+                    }
+                    for result in prediction_results
+                ],
+                session=session,
+            )
+            upsert_leaf_embeddings_batch(
+                [
+                    {
+                        "org_id": org_id,
+                        "sample_id": result.sample_id,
+                        "model_id": model_id,
+                        "leaf_indices": result.leaf_indices,
+                        "leaf_encoding": result.leaf_encoding,
+                    }
+                    for result in prediction_results
+                ],
+                session=session,
+            )
+        return prediction_results
+    except Exception:
+        logger.exception(
+            f"Bulk save for model {model_id} failed, retrying row by row"
+        )
+    
+    saved = []
+    for result in prediction_results:
+        try:
+            with db_session() as session:
+                upsert_prediction(
+                    org_id=org_id,
+                    sample_id=result.sample_id,
+                    model_id=model_id,
+                    y_hat=result.y_hat,
+                    threshold=result.threshold,
+                    predicted_class=result.predicted_class,
+                    model_etag=result.model_etag,
+                    session=session,
+                )
+                
+                upsert_leaf_embedding(
+                    org_id=org_id,
+                    sample_id=result.sample_id,
+                    model_id=model_id,
+                    leaf_indices=result.leaf_indices,
+                    leaf_encoding=result.leaf_encoding,
+                    session=session,
+                )
+            saved.append(result)
+        except Exception as e:
+            errors.append({
+                "sample_id": result.sample_id,
+                "error": f"Failed to save prediction: {str(e)}"
+            })
+    return saved
+
+
+def _load_predict_inputs(
+    org_id: str,
+    sample_id: str,
+    model_id: str,
+) -> Tuple[Optional[dict], Optional[dict], Optional[dict]]:
+    """
+    Look up a prediction's model, sample and features on one connection.
+    
+    Returns:
+        Tuple of (model, sample, sample_features); each is None if missing
+    """
+    with db_session() as session:
+        # 1. Verify and get model (defense in depth - verify org ownership)
+        model = get_model(model_id, org_id)
+        
+        # 2. Verify and get sample
+        sample = get_sample(sample_id, org_id, session=session)
+        
+        # 3. Get sample features for the model's feature set
+        sample_features = None
+        if model and sample:
+            sample_features = get_sample_features_by_feature_set(
+                sample_id=sample_id,
+                feature_set_id=model["feature_set_id"],
+                org_id=org_id,
+                session=session,
+            )
+    return model, sample, sample_features
+
+
+def _save_prediction(
+    org_id: str,
+    job_id: Optional[str],
+    result: PredictionResult,
+) -> None:
+    """Upsert a prediction and its leaf embedding and mark the job succeeded."""
+    with db_session() as session:
+        upsert_prediction(
+            org_id=org_id,
+            sample_id=result.sample_id,
+            model_id=result.model_id,
+            y_hat=result.y_hat,
+            threshold=result.threshold,
+            predicted_class=result.predicted_class,
+            model_etag=result.model_etag,
+            session=session,
+        )
+        
+        upsert_leaf_embedding(
+            org_id=org_id,
+            sample_id=result.sample_id,
+            model_id=result.model_id,
+            leaf_indices=result.leaf_indices,
+            leaf_encoding=result.leaf_encoding,
+            session=session,
+        )
+        
+        # Update job as succeeded
+        if job_id:
+            update_job_status(
+                job_id=job_id,
+                status="succeeded",
+                output={
+                    "y_hat": result.y_hat,
+                    "threshold": result.threshold,
+                    "predicted_class": result.predicted_class,
+                    "num_trees": result.num_trees,
+                },
+                session=session,
+            )
+
+
+def _collect_batch_samples(
+    org_id: str,
+    model_id: str,
+    model_etag: Optional[str],
+    sample_ids: List[str],
+    feature_set_id: str,
+    threshold: float,
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], Dict[str, dict], List[dict]]:
+    """
+    Verify a batch's samples and fetch what's needed to predict them.
+    
+    Samples whose stored prediction is still current (made after their
+    features were computed, by the same model bundle, at the same
+    threshold) are returned as is rather than predicted again, so
+    retried batches skip inference and writes for work already done.
+    
+    Returns:
+        Tuple of ((sample_id, features) pairs to predict, current
+        predictions keyed by sample ID, per-sample errors)
+    """
+    samples_to_predict = []
+    errors = []
+    
+    with db_session() as session:
+        # Verify all samples, find current predictions, then fetch the
+        # remaining samples' features, one round trip each
+        samples = get_samples_by_ids(sample_ids, org_id, session=session)
+        cached = {}
+        if model_etag is not None:
+            cached = {
+                sample_id: prediction
+                for sample_id, prediction in get_current_predictions(
+                    list(samples), model_id, model_etag, feature_set_id,
+                    org_id, session=session,
+                ).items()
+                if prediction["threshold"] == threshold
+            }
+        features_by_sample = get_sample_features_by_sample_ids(
+            [sample_id for sample_id in samples if sample_id not in cached],
+            feature_set_id,
+            org_id,
+            session=session,
+        )
+        
+        for sample_id in sample_ids:
+            # Verify sample
+            sample = samples.get(sample_id)
+            if not sample:
+                errors.append({
+                    "sample_id": sample_id,
+                    "error": "Sample not found or access denied"
+                })
+                continue
+            
+            if sample_id in cached:
+                continue
+            
+            # Get features
+            sample_features = features_by_sample.get(sample_id)
+            if not sample_features:
+                errors.append({
+                    "sample_id": sample_id,
+                    "error": "Features not found for required feature set"
+                })
+                continue
+            
+            samples_to_predict.append((sample_id, sample_features["features"]))
+    
+    return samples_to_predict, cached, errors
@@ -1,16 +1,33 @@
 """S3 utilities for downloading files."""
 
+import io
+import shutil
 import boto3
+from botocore.exceptions import ClientError
+from functools import lru_cache
 from io import BytesIO
-from typing import Union
+from tempfile import SpooledTemporaryFile
+from typing import Optional, Tuple, Union
 
 from .config import get_settings
 
+# Files up to this size are spooled in memory; larger ones spill to disk
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
 
+# Read size when streaming an object body into a file
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
 def get_s3_client():
-    """Create S3 client."""
+    """
+    Get cached S3 client.
+    
+    Built from its own boto3 Session because the default session is not
+    thread-safe; the client itself is safe to share across job threads.
+    """
     settings = get_settings()
-    return boto3.client(
+    return boto3.session.Session().client(
         "s3",
         aws_access_key_id=settings.aws_access_key_id,
         aws_secret_access_key=settings.aws_secret_access_key,
@@ -30,6 +47,165 @@ def download_file(storage_key: str) -> bytes:
     return buffer.read()
 
 
+def download_file_spooled(
+    storage_key: str,
+    max_size: int = SPOOL_MAX_SIZE,
+    if_match: Optional[str] = None,
+) -> SpooledTemporaryFile:
+    """
+    Download a file from S3 into a seekable spooled temp file.
+    
+    The object is streamed in chunks rather than held as one bytes
+    object, so large files (e.g. model bundles) spill to disk past
+    `max_size` instead of inflating memory. The caller owns the file and
+    should close it (it can be used as a context manager).
+    
+    With `if_match`, the download fails (a 412 ClientError) unless the
+    object's ETag still equals it.
+    """
+    settings = get_settings()
+    client = get_s3_client()
+    
+    spooled = SpooledTemporaryFile(max_size=max_size)
+    try:
+        if if_match is None:
+            client.download_fileobj(settings.aws_s3_bucket, storage_key, spooled)
+        else:
+            # download_fileobj doesn't accept IfMatch; stream a single GET
+            response = client.get_object(
+                Bucket=settings.aws_s3_bucket,
+                Key=storage_key,
+                IfMatch=if_match,
+            )
+            shutil.copyfileobj(response["Body"], spooled, COPY_CHUNK_SIZE)
+    except Exception:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    
+    return spooled
+
+
+def fetch_range(storage_key: str, start: int, end: int) -> bytes:
+    """Download bytes `start` through `end` (inclusive) of a file from S3."""
+    settings = get_settings()
+    client = get_s3_client()
+    
+    response = client.get_object(
+        Bucket=settings.aws_s3_bucket,
+        Key=storage_key,
+        Range=f"bytes={start}-{end}",
+    )
+    return response["Body"].read()
+
+
+def fetch_tail(storage_key: str, length: int) -> Tuple[bytes, int]:
+    """
+    Download the last `length` bytes of a file from S3.
+    
+    Returns:
+        Tuple of (tail bytes, total file size); the tail is the whole
+        file if it is shorter than `length`
+    """
+    settings = get_settings()
+    client = get_s3_client()
+    
+    try:
+        response = client.get_object(
+            Bucket=settings.aws_s3_bucket,
+            Key=storage_key,
+            Range=f"bytes=-{length}",
+        )
+    except ClientError as e:
+        # S3 answers a suffix range on an empty object with 416
+        if e.response.get("Error", {}).get("Code") == "InvalidRange":
+            return b"", 0
+        raise
+    # ContentRange looks like "bytes 123-456/457"
+    size = int(response["ContentRange"].rsplit("/", 1)[1])
+    return response["Body"].read(), size
+
+
+class S3RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable view of an S3 object backed by Range GETs.
+    
+    The object's tail is fetched up front and reads inside it are served
+    from memory; anything else fetches just the bytes asked for. Suited to
+    zip archives, which keep their central directory at the end, when
+    only a few members are needed.
+    """
+    
+    def __init__(self, storage_key: str, tail_size: int = 64 * 1024):
+        self._storage_key = storage_key
+        self._tail, self._size = fetch_tail(storage_key, tail_size)
+        self._tail_start = self._size - len(self._tail)
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            # OSError, like a real file, so callers probing from the end
+            # of a short file (zipfile does) treat it as out of range
+            raise OSError(f"Negative seek position: {pos}")
+        self._pos = pos
+        return pos
+    
+    def readinto(self, buffer) -> int:
+        end = min(self._pos + len(buffer), self._size)
+        if end <= self._pos:
+            return 0
+        
+        if self._pos >= self._tail_start:
+            data = self._tail[self._pos - self._tail_start:end - self._tail_start]
+        else:
+            data = fetch_range(self._storage_key, self._pos, end - 1)
+        
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def open_range_reader(
+    storage_key: str,
+    buffer_size: int = 64 * 1024,
+) -> io.BufferedReader:
+    """
+    Open an S3 file for random-access reads without downloading it.
+    
+    Small reads are coalesced into `buffer_size` Range GETs.
+    """
+    return io.BufferedReader(
+        S3RangeFile(storage_key, tail_size=buffer_size),
+        buffer_size=buffer_size,
+    )
+
+
+def get_object_etag(storage_key: str) -> str:
+    """Get a file's current ETag from S3 without downloading it."""
+    settings = get_settings()
+    client = get_s3_client()
+    
+    response = client.head_object(Bucket=settings.aws_s3_bucket, Key=storage_key)
+    return response["ETag"]
+
+
 def download_file_as_string(storage_key: str, encoding: str = "utf-8") -> str:
     """Download a file from S3 and return as string."""
     content = download_file(storage_key)